@@ -1,47 +1,105 @@
 from datetime import datetime, timezone, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from src.db.session import get_db
-from src.schemas.token import TokenOut
+from src.schemas.token import TokenOut, RefreshIn
 from src.core.jwt import create_access_token
-from src.core.security import verify_password
-from src.core.config import settings
+from src.core.security import verify_password_async, PasswordHasherBusy
+from src.core.login_limiter import login_limiter
 from src.models.user import User
+from src.services.token_service import issue_refresh_token, rotate_refresh_token, revoke_refresh_token
 
 router = APIRouter()
 
+def _get_user_by_email(db: Session, email: str) -> User | None:
+    return db.query(User).filter(User.email == email).one_or_none()
+
+
+def _persist_lockout(db: Session, user: User, now: datetime) -> None:
+    # пишем в users только при срабатывании блокировки, а не на каждую неудачу
+    user.locked_until = now + timedelta(seconds=login_limiter.lock_seconds)
+    db.commit()
+
+
+def _too_many_attempts(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many attempts. Try later.",
+        headers={"Retry-After": str(max(retry_after, 1))},
+    )
+
+
+def _register_successful_login(db: Session, user: User, now: datetime) -> str:
+    user.login_attempts = 0
+    user.locked_until = None
+    user.last_login_at = now
+    refresh_token = issue_refresh_token(db, user.id)
+    db.commit()
+    return refresh_token
+
+
 @router.post("/login", response_model=TokenOut)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    # async: bcrypt считается в своём пуле (src.core.security), запросы к БД — в threadpool,
+    # так что ожидание хеширования не держит ни event loop, ни воркеры других эндпоинтов
     # OAuth2PasswordRequestForm использует поле username (туда кладём email)
     email = form_data.username
     password = form_data.password
+    limiter_key = email.strip().lower()
 
-    user = db.query(User).filter(User.email == email).one_or_none()
+    # заблокированный email отсекаем до запроса к БД и до bcrypt
+    retry_after = login_limiter.locked_for(limiter_key)
+    if retry_after:
+        raise _too_many_attempts(retry_after)
+
+    user = await run_in_threadpool(_get_user_by_email, db, email)
     if not user:
+        # неизвестные email тоже считаем, иначе перебор по списку адресов не ограничен
+        login_limiter.register_failure(limiter_key)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     now = datetime.now(timezone.utc)
 
+    # сохранённая блокировка переживает рестарт и видна воркерам без общего стора
     if user.locked_until and user.locked_until > now:
-        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many attempts. Try later.")
-
-    if not verify_password(password, user.hashed_password):
-        user.login_attempts = (user.login_attempts or 0) + 1
-        if user.login_attempts >= settings.LOGIN_MAX_ATTEMPTS:
-            user.locked_until = now + timedelta(minutes=settings.LOGIN_LOCK_MINUTES)
-            user.login_attempts = 0
-        db.commit()
+        raise _too_many_attempts(int((user.locked_until - now).total_seconds()))
+
+    try:
+        password_ok = await verify_password_async(password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Login is busy. Try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+    if not password_ok:
+        if login_limiter.register_failure(limiter_key):
+            await run_in_threadpool(_persist_lockout, db, user, now)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
-    user.login_attempts = 0
-    user.locked_until = None
-    user.last_login_at = now
-    db.commit()
+    login_limiter.reset(limiter_key)
+    refresh_token = await run_in_threadpool(_register_successful_login, db, user, now)
+
+    token = create_access_token({"sub": user.email, "role": user.role.value})
+    return TokenOut(access_token=token, refresh_token=refresh_token)
 
+
+@router.post("/refresh", response_model=TokenOut)
+def refresh(data: RefreshIn, db: Session = Depends(get_db)):
+    # продление сессии без пароля и bcrypt; старый refresh token после этого недействителен
+    user, refresh_token = rotate_refresh_token(db, data.refresh_token)
     token = create_access_token({"sub": user.email, "role": user.role.value})
-    return TokenOut(access_token=token)
+    return TokenOut(access_token=token, refresh_token=refresh_token)
+
+
+@router.post("/logout")
+def logout(data: RefreshIn, db: Session = Depends(get_db)):
+    revoke_refresh_token(db, data.refresh_token)
+    return {"ok": True}
 
 # Заглушка для ESIA gosuslugi
 # @router.post("/esia")
@@ -3,7 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from src.db.session import get_db
-from src.services.deps import require_roles, get_current_user
+from src.services.deps import require_roles, get_current_user, get_read_db
 from src.models.user import User
 from src.crud.patients import patient_crud
 from src.crud.checklists import patient_checklist_crud, patient_checklist_item_crud
@@ -53,7 +53,7 @@ def save_blood_labs(
 @router.get("/patients/{patient_id}/labs/blood/latest", response_model=BloodLabOut)
 def get_latest_blood_labs(
     patient_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user: User = Depends(get_current_user),
     _=Depends(require_roles("admin", "feldsher", "surgeon")),
 ):
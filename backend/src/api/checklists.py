@@ -7,6 +7,7 @@ from src.db.session import get_db
 from src.services.deps import require_roles
 
 from src.crud.checklists import template_crud, template_item_crud
+from src.services.template_cache import bump_templates_version
 from src.schemas.checklist import (
     ChecklistTemplateOut,
     ChecklistTemplateUpdate,
@@ -51,6 +52,7 @@ def create_template_with_items(
     template = template_crud.create(
         db,
         obj_in=data.model_copy(update={"items": []}),  # create() не умеет items, поэтому создаём отдельно
+        commit=False,
     )
 
     # Добавляем пункты
@@ -66,8 +68,14 @@ def create_template_with_items(
                 requires_value=item.requires_value,
                 value_hint=item.value_hint,
             ),
+            commit=False,
         )
 
+    # новый шаблон мог стать активным для operation_type — сбрасываем кэш шаблонов во всех воркерах
+    # (в той же транзакции, что и сам шаблон)
+    bump_templates_version(db)
+    db.commit()
+
     db.refresh(template)
     # Подтянем items чтобы вернуть их в ответе
     template.items
@@ -96,6 +104,9 @@ def update_template(
     template = template_crud.get(db, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Checklist template not found")
-    template = template_crud.update(db, template, data)
+    template = template_crud.update(db, template, data, commit=False)
+    bump_templates_version(db)
+    db.commit()
+    db.refresh(template)
     template.items
     return template
\ No newline at end of file
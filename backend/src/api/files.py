@@ -3,11 +3,14 @@ from __future__ import annotations
 import os
 import uuid
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from src.db.session import get_db
-from src.services.deps import require_roles, get_current_user
+from src.db.async_session import get_async_db
+from src.services.deps import require_roles, get_current_user, get_async_read_db
 from src.models.user import User
 from src.crud.patients import patient_crud
 from src.crud.checklists import patient_checklist_crud
@@ -27,39 +30,44 @@ def _ensure_patient_scope(user: User, patient):
         raise HTTPException(status_code=403, detail="Forbidden")
 
 
+def _write_upload(path: str, content: bytes) -> None:
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
 @router.post("/patients/{patient_id}/files", response_model=FileAssetOut)
 async def upload_patient_file(
     patient_id: int,
     checklist_item_id: int | None = None,
     kind: str | None = None,
     uploaded_file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
     _=Depends(require_roles("admin", "feldsher")),
 ):
-    patient = patient_crud.get(db, patient_id)
+    # весь эндпоинт на AsyncSession: запросы к БД не блокируют event loop
+    patient = await patient_crud.aget(db, patient_id)
     if not patient:
         raise HTTPException(404, "Patient not found")
     _ensure_patient_scope(user, patient)
 
     # если указан checklist_item_id — проверим что он принадлежит этому пациенту
     if checklist_item_id is not None:
-        checklist = patient_checklist_crud.get_latest_for_patient(db, patient_id)
+        checklist = await patient_checklist_crud.aget_latest_for_patient(db, patient_id)
         if not checklist:
             raise HTTPException(404, "Checklist not found")
-        item = patient_checklist_item_crud.get_for_checklist(db, checklist.id, checklist_item_id)
+        item = await patient_checklist_item_crud.aget_for_checklist(db, checklist.id, checklist_item_id)
         if not item:
             raise HTTPException(404, "Checklist item not found")
 
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
     ext = os.path.splitext(uploaded_file.filename or "")[1]
     safe_name = f"{uuid.uuid4().hex}{ext}"
     storage_path = os.path.join(UPLOAD_DIR, safe_name)
 
     content = await uploaded_file.read()
-    with open(storage_path, "wb") as f:
-        f.write(content)
+    # запись на диск — тоже блокирующая, уносим в threadpool
+    await run_in_threadpool(_write_upload, storage_path, content)
 
     fa = FileAsset(
         patient_id=patient_id,
@@ -71,24 +79,24 @@ async def upload_patient_file(
         storage_path=storage_path,
     )
     db.add(fa)
-    db.commit()
-    db.refresh(fa)
+    await db.commit()
+    await db.refresh(fa)
     return fa
 
 
 @router.get("/patients/{patient_id}/files", response_model=list[FileAssetOut])
-def list_patient_files(
+async def list_patient_files(
     patient_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     user: User = Depends(get_current_user),
     _=Depends(require_roles("admin", "feldsher", "surgeon")),
 ):
-    patient = patient_crud.get(db, patient_id)
+    patient = await patient_crud.aget(db, patient_id)
     if not patient:
         raise HTTPException(404, "Patient not found")
     _ensure_patient_scope(user, patient)
 
-    return list(file_crud.list_for_patient(db, patient_id))
+    return list(await file_crud.alist_for_patient(db, patient_id))
 
 
 @router.get("/files/{file_id}/download")
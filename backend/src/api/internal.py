@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+
+from src.services.deps import require_roles
+from src.db.session import engine
+from src.db.async_session import async_engine
+from src.db.pool import pool_snapshot
+from src.db.query_stats import query_report
+
+router = APIRouter()
+
+
+@router.get("/db/pool")
+def db_pool(_=Depends(require_roles("admin"))):
+    # состояние пулов этого воркера: занято / свободно / overflow, ожидание checkout и таймауты
+    return {
+        "sync": pool_snapshot(engine),
+        "async": pool_snapshot(async_engine.sync_engine),
+    }
+
+
+@router.get("/db/queries")
+def db_queries(reset: bool = False, _=Depends(require_roles("admin"))):
+    # число запросов, время в БД и вероятные N+1 по маршрутам (нужен QUERY_STATS_ENABLED=true)
+    report = query_report.snapshot()
+    if reset:
+        query_report.reset()
+    return report
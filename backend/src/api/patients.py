@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 
 from src.db.session import get_db
 from src.schemas.patient import PatientCreate, PatientUpdate, PatientOut, EmiassyncIn
+from src.crud.base import commit_or_conflict
+from src.core.pagination import encode_cursor, decode_cursor
 from src.crud.patients import patient_crud
-from src.services.deps import get_current_user, require_roles
+from src.services.deps import get_current_user, get_read_db, require_roles
 from src.models.patient import PatientStatus, Patient
 from src.models.user import User
 from src.crud.checklists import patient_checklist_crud
@@ -12,12 +14,17 @@ from src.schemas.patient_checklist import (
     PatientChecklistOut,
     PatientChecklistItemOut,
     PatientChecklistItemUpdate,
+    PatientChecklistItemsBulkUpdate,
     PatientChecklistProgressOut,
+    PatientChecklistViewOut,
 )
+from src.services.patient_search import search_patients
 from src.services.checklist_service import (
     generate_checklist_for_patient,
     update_patient_checklist_item,
+    bulk_update_patient_checklist_items,
     get_checklist_progress,
+    get_checklist_view,
 )
 
 from datetime import datetime
@@ -38,18 +45,42 @@ def _ensure_patient_scope(user: User, patient: Patient) -> None:
 
 @router.get("/", response_model=list[PatientOut])
 def list_patients(
+    response: Response,
     status: PatientStatus | None = None,
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db),
+    cursor: str | None = None,
+    db: Session = Depends(get_read_db),
     user: User = Depends(get_current_user),
     _=Depends(require_roles("admin", "feldsher", "surgeon")),
 ):
+    # cursor (из X-Next-Cursor предыдущей страницы) — keyset-пагинация; offset оставлен для совместимости
+    position = decode_cursor(cursor) if cursor else None
+
     # Важно: фильтруем по organization_id, если не admin
     if user.role.value != "admin":
-        return patient_crud.list_for_org(db, org_id=user.organization_id, status=status, limit=limit, offset=offset)
-
-    return patient_crud.list(db, status=status, limit=limit, offset=offset)
+        rows = patient_crud.list_for_org(
+            db, org_id=user.organization_id, status=status, limit=limit, offset=offset, cursor=position
+        )
+    else:
+        rows = patient_crud.list(db, status=status, limit=limit, offset=offset, cursor=position)
+
+    if rows and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    return rows
+
+
+# объявлен до /{patient_id}, иначе "search" уйдёт в patient_id
+@router.get("/search", response_model=list[PatientOut])
+def search_patients_endpoint(
+    q: str = Query(min_length=2, max_length=128),
+    limit: int = 20,
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+    _=Depends(require_roles("admin", "feldsher", "surgeon")),
+):
+    # ФИО (префикс/подстрока/опечатки), СНИЛС или полис — в пределах организации пользователя
+    return search_patients(db, user, q, limit=limit)
 
 
 @router.post("/", response_model=PatientOut)
@@ -114,7 +145,7 @@ def emias_sync(patient_id: int, data: EmiassyncIn,
         "polis": data.polis,
         "snils": data.snils,
     }
-    db.add(patient); db.commit(); db.refresh(patient)
+    db.add(patient); commit_or_conflict(db); db.refresh(patient)
     return {"ok": True, "fhir_id": patient.fhir_id}
 
 
@@ -132,17 +163,15 @@ def generate_patient_checklist(
         raise HTTPException(status_code=404, detail="Patient not found")
     _ensure_patient_scope(user, patient)
 
-    checklist = generate_checklist_for_patient(db, patient, template_id=template_id)
-    # подгружаем items (если не подгрузились)
-    checklist.items
-    return checklist
+    # items уже загружены сервисом
+    return generate_checklist_for_patient(db, patient, template_id=template_id)
 
 
 # --- Get latest checklist for patient ---
 @router.get("/{patient_id}/checklist", response_model=PatientChecklistOut)
 def get_latest_patient_checklist(
     patient_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user: User = Depends(get_current_user),
     _=Depends(require_roles("admin", "feldsher", "surgeon")),
 ):
@@ -158,6 +187,27 @@ def get_latest_patient_checklist(
     return checklist
 
 
+# --- Checklist view for UI: items + template metadata + file counts + progress ---
+@router.get("/{patient_id}/checklist/view", response_model=PatientChecklistViewOut)
+def get_patient_checklist_view(
+    patient_id: int,
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+    _=Depends(require_roles("admin", "feldsher", "surgeon")),
+):
+    patient = patient_crud.get(db, patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    _ensure_patient_scope(user, patient)
+
+    # фиксированное число запросов независимо от размера чек-листа:
+    # пациент, шапка, items+шаблоны, количество файлов
+    checklist = patient_checklist_crud.get_latest_for_patient_with_items(db, patient_id)
+    if not checklist:
+        raise HTTPException(status_code=404, detail="Checklist not found")
+    return get_checklist_view(db, checklist)
+
+
 # --- (C) Update checklist item ---
 @router.patch("/{patient_id}/checklist/items/{item_id}", response_model=PatientChecklistItemOut)
 def patch_patient_checklist_item(
@@ -187,6 +237,28 @@ def patch_patient_checklist_item(
     return updated_item
 
 
+# --- Bulk update checklist items (офлайн-планшет: много отметок за раз) ---
+@router.patch("/{patient_id}/checklist/items", response_model=list[PatientChecklistItemOut])
+def patch_patient_checklist_items(
+    patient_id: int,
+    data: PatientChecklistItemsBulkUpdate,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    _=Depends(require_roles("admin", "feldsher")),
+):
+    patient = patient_crud.get(db, patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    _ensure_patient_scope(user, patient)
+
+    checklist = patient_checklist_crud.get_latest_for_patient(db, patient_id)
+    if not checklist:
+        raise HTTPException(status_code=404, detail="Checklist not found")
+
+    # всё или ничего: одна транзакция и один пересчёт статуса на всю пачку
+    return bulk_update_patient_checklist_items(db, patient, checklist, data.items)
+
+
 @router.get("/{patient_id}/checklist/progress", response_model=PatientChecklistProgressOut)
 def get_patient_checklist_progress(
     patient_id: int,
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from src.api import auth, organizations, users, patients, sync, checklists, files, iol, blood_labs
+from src.api import auth, organizations, users, patients, sync, checklists, files, iol, blood_labs, internal
 
 
 api_router = APIRouter()
@@ -12,3 +12,4 @@ api_router.include_router(sync.router, prefix="/sync", tags=["sync"])
 api_router.include_router(files.router, tags=["files"])
 api_router.include_router(iol.router, tags=["iol"])
 api_router.include_router(blood_labs.router, tags=["labs"])
+api_router.include_router(internal.router, prefix="/internal", tags=["internal"])
@@ -1,25 +1,185 @@
-from fastapi import APIRouter, Depends
+import asyncio
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
 
-from src.db.session import get_db
-from src.schemas.oplog import BatchIn, BatchOut
+from src.core.config import settings
+from src.core.codecs import read_request_body, iter_decompressed, stream_decoder, encode_response, request_body_openapi
+from src.db.session import get_db, SessionLocal
+from src.schemas.oplog import BatchIn, BatchOut, OpIn, OpResult, ChangesOut, SyncJobOut
+from src.services.change_feed import get_changes
 from src.services.deps import get_current_user, require_roles
-from src.services.sync_service import apply_op
+from src.services.sync_service import apply_batch, apply_ndjson_chunk, parse_ndjson_op, ACTION_METRICS
+from src.services.sync_jobs import submit_batch_job, get_job_for_user
 
 router = APIRouter()
 
-@router.post("/batch", response_model=BatchOut)
+# сколько распакованных кусков тела держим между чтением запроса и применением ops
+BODY_QUEUE_CHUNKS = 16
+
+
+async def read_batch(request: Request) -> BatchIn:
+    # тело может быть JSON или MessagePack, сжатое gzip/zstd (Content-Type / Content-Encoding)
+    data = await read_request_body(request)
+    try:
+        return BatchIn.model_validate(data)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors()) from e
+
+
+@router.post(
+    "/batch",
+    response_model=BatchOut | SyncJobOut,
+    responses={202: {"model": SyncJobOut, "description": "Batch queued as a background job"}},
+    # тело читает read_batch (JSON/MessagePack), поэтому схему BatchIn описываем явно
+    openapi_extra=request_body_openapi(BatchIn),
+)
 def sync_batch(
-    batch: BatchIn,
+    request: Request,
+    batch: BatchIn = Depends(read_batch),
+    background: bool = False,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user),
+    _=Depends(require_roles("admin", "feldsher", "surgeon")),
+):
+    # большие пачки (или по запросу клиента) — в фон, статус через /sync/jobs/{id}
+    if background or len(batch.ops) > settings.SYNC_ASYNC_THRESHOLD_OPS:
+        job = submit_batch_job(db, batch.ops, user=user)
+        return encode_response(request, SyncJobOut.model_validate(job), status_code=status.HTTP_202_ACCEPTED)
+    return encode_response(request, apply_batch(db, batch.ops, user=user))
+
+
+@router.get("/jobs/{job_id}", response_model=SyncJobOut)
+def sync_job_status(
+    job_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user),
+    _=Depends(require_roles("admin", "feldsher", "surgeon")),
+):
+    job = get_job_for_user(db, job_id, user)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return encode_response(request, SyncJobOut.model_validate(job))
+
+
+def _apply_chunk(items: list[OpIn | OpResult], user) -> list[OpResult]:
+    # своя короткая сессия на кусок: identity map не растёт вместе с потоком
+    with SessionLocal() as db:
+        return apply_ndjson_chunk(db, items, user=user)
+
+
+async def _pump_body(request: Request, decoder, queue: asyncio.Queue) -> None:
+    # единственный читатель receive(), пока тело не кончилось; ошибки уходят в очередь
+    try:
+        async for data in iter_decompressed(request, decoder):
+            await queue.put(data)
+    except Exception as e:
+        await queue.put(e)
+    else:
+        await queue.put(None)
+
+
+class _PumpedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse, который не трогает receive(), пока _pump_body не дочитал тело:
+    иначе ожидание disconnect в Starlette забирает у request.stream() куски тела и поток виснет.
+    """
+
+    def __init__(self, content, pump: asyncio.Task, **kwargs):
+        super().__init__(content, **kwargs)
+        self.pump = pump
+
+    async def __call__(self, scope, receive, send):
+        async def receive_after_body():
+            await asyncio.wait([self.pump])
+            return await receive()
+
+        try:
+            await super().__call__(scope, receive_after_body, send)
+        finally:
+            self.pump.cancel()
+
+
+async def _stream_results(queue: asyncio.Queue, user) -> AsyncIterator[bytes]:
+    chunk: list[OpIn | OpResult] = []
+    buffer = b""
+
+    async def flush() -> AsyncIterator[bytes]:
+        results = await run_in_threadpool(_apply_chunk, chunk[:], user)
+        chunk.clear()
+        for r in results:
+            yield r.model_dump_json().encode() + b"\n"
+
+    while True:
+        data = await queue.get()
+        if data is None:
+            if buffer.strip():
+                chunk.append(parse_ndjson_op(buffer))
+            break
+        if isinstance(data, ClientDisconnect):
+            return
+        if isinstance(data, HTTPException):
+            # битое сжатие / слишком большое тело: ответ уже идёт, статус не поменять
+            chunk.append(OpResult(op_id="", status="error", message=data.detail))
+            break
+        if isinstance(data, Exception):
+            raise data
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            chunk.append(parse_ndjson_op(line))
+            if len(chunk) >= settings.SYNC_STREAM_CHUNK_SIZE:
+                async for out in flush():
+                    yield out
+        if len(buffer) > settings.SYNC_STREAM_MAX_LINE_BYTES:
+            # строка без конца — дальше читать поток нет смысла
+            chunk.append(OpResult(op_id="", status="error", message="Line too long"))
+            break
+
+    if chunk:
+        async for out in flush():
+            yield out
+
+
+@router.post("/batch/stream")
+async def sync_batch_stream(
+    request: Request,
+    user = Depends(get_current_user),
+    _=Depends(require_roles("admin", "feldsher", "surgeon")),
+):
+    """
+    Потоковый вариант /sync/batch: тело — NDJSON (одна OpIn на строку),
+    ops применяются кусками по SYNC_STREAM_CHUNK_SIZE, ответ — NDJSON из OpResult.
+    Память не зависит от размера бэклога; распакованное тело — не больше SYNC_STREAM_MAX_BODY_BYTES.
+    """
+    decoder = stream_decoder(request.headers.get("content-encoding"))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=BODY_QUEUE_CHUNKS)
+    pump = asyncio.create_task(_pump_body(request, decoder, queue))
+    return _PumpedStreamingResponse(_stream_results(queue, user), pump=pump, media_type="application/x-ndjson")
+
+
+@router.get("/changes", response_model=ChangesOut)
+def sync_changes(
+    request: Request,
+    since: int = 0,
+    limit: int = 500,
     db: Session = Depends(get_db),
     user = Depends(get_current_user),
     _=Depends(require_roles("admin", "feldsher", "surgeon")),
 ):
-    results = []
-    applied_ids = []
-    for op in batch.ops:
-        r = apply_op(db, op, user=user)  # <-- здесь
-        results.append(r)
-        if r.status == "applied":
-            applied_ids.append(r.op_id)
-    return BatchOut(results=results, applied_ids=applied_ids)
\ No newline at end of file
+    return encode_response(request, get_changes(db, user, since=since, limit=limit))
+
+
+@router.get("/metrics")
+def sync_metrics(_=Depends(require_roles("admin"))):
+    # латентность (мс) и ошибки по каждому action в этом процессе
+    return ACTION_METRICS.snapshot()
\ No newline at end of file
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    Ограниченный LRU-кэш с TTL, потокобезопасный. Живёт в памяти процесса:
+    между воркерами не синхронизируется, устаревание ограничено ttl.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys: Any) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
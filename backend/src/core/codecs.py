@@ -0,0 +1,264 @@
+"""
+Кодеки тела запроса/ответа для синка: gzip/zstd + JSON/MessagePack.
+Контракт — те же Pydantic-схемы (src/schemas/oplog.py), меняется только представление на проводе.
+msgpack и zstandard — опциональные зависимости: без них работают JSON и gzip.
+"""
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import zlib
+from typing import Any, AsyncIterator
+
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+
+from src.core.config import settings
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None  # type: ignore
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore
+
+MSGPACK_MEDIA_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def _header_tokens(value: str | None) -> list[str]:
+    # "gzip;q=1.0, zstd" -> ["gzip", "zstd"]; q-веса не учитываем, порядок предпочтений — наш
+    return [t.split(";")[0].strip().lower() for t in (value or "").split(",") if t.strip()]
+
+
+def _is_msgpack(content_type: str | None) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() in MSGPACK_MEDIA_TYPES
+
+
+def _read_limited(stream, limit: int) -> bytes:
+    data = stream.read(limit + 1)
+    if len(data) > limit:
+        raise HTTPException(status_code=413, detail="Request body too large")
+    return data
+
+
+def decompress(body: bytes, content_encoding: str | None) -> bytes:
+    encoding = (content_encoding or "identity").strip().lower()
+    limit = settings.SYNC_MAX_BODY_BYTES
+    try:
+        if encoding in ("identity", ""):
+            data = body
+        elif encoding == "gzip":
+            data = _read_limited(gzip.GzipFile(fileobj=io.BytesIO(body)), limit)
+        elif encoding == "zstd" and zstandard is not None:
+            data = _read_limited(zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)), limit)
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    except (OSError, EOFError, zlib.error) as e:
+        raise HTTPException(status_code=400, detail="Malformed compressed body") from e
+    except Exception as e:
+        if zstandard is not None and isinstance(e, zstandard.ZstdError):
+            raise HTTPException(status_code=400, detail="Malformed compressed body") from e
+        raise
+    if len(data) > limit:
+        raise HTTPException(status_code=413, detail="Request body too large")
+    return data
+
+
+def decode_body(body: bytes, content_type: str | None, content_encoding: str | None) -> Any:
+    data = decompress(body, content_encoding)
+    try:
+        if _is_msgpack(content_type):
+            if msgpack is None:
+                raise HTTPException(status_code=415, detail="MessagePack is not supported by this server")
+            return msgpack.unpackb(data, raw=False)
+        return json.loads(data)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Malformed request body") from e
+    except Exception as e:
+        if msgpack is not None and isinstance(e, msgpack.UnpackException):
+            raise HTTPException(status_code=400, detail="Malformed request body") from e
+        raise
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail="Request body too large")
+
+
+async def _read_body_limited(request: Request, limit: int) -> bytes:
+    # лимит — до буферизации: по Content-Length сразу, иначе по мере чтения потока
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit:
+        raise _too_large()
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise _too_large()
+    return bytes(body)
+
+
+async def read_request_body(request: Request) -> Any:
+    return decode_body(
+        await _read_body_limited(request, settings.SYNC_MAX_BODY_BYTES),
+        request.headers.get("content-type"),
+        request.headers.get("content-encoding"),
+    )
+
+
+# размер кусков, которыми zstd отдаёт распакованные данные (и шаг проверки лимита)
+ZSTD_WRITE_SIZE = 64 * 1024
+
+
+class _GzipStreamDecoder:
+    def __init__(self):
+        self._d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, chunk: bytes, room: int) -> bytes:
+        # max_length: gzip-бомба не раздувается в памяти дальше лимита
+        out = self._d.decompress(chunk, room + 1)
+        while self._d.unconsumed_tail and len(out) <= room:
+            out += self._d.decompress(self._d.unconsumed_tail, room + 1 - len(out))
+        return out
+
+    @property
+    def complete(self) -> bool:
+        return self._d.eof
+
+
+class _ZstdStreamDecoder:
+    """
+    У zstd decompressobj нет max_length: распаковываем через stream_writer, который
+    отдаёт результат кусками по ZSTD_WRITE_SIZE в write() — там и обрываем по лимиту.
+    """
+
+    def __init__(self):
+        self._writer = zstandard.ZstdDecompressor().stream_writer(self, write_size=ZSTD_WRITE_SIZE, closefd=False)
+        self._out: list[bytes] = []
+        self._room = 0
+
+    def write(self, data: bytes) -> int:
+        self._room -= len(data)
+        if self._room < 0:
+            raise _too_large()
+        self._out.append(data)
+        return len(data)
+
+    def decompress(self, chunk: bytes, room: int) -> bytes:
+        self._room = room
+        self._out.clear()
+        self._writer.write(chunk)
+        return b"".join(self._out)
+
+    @property
+    def complete(self) -> bool:
+        # конец кадра stream_writer не сообщает: обрезанная последняя строка разберётся как битая op
+        return True
+
+
+def stream_decoder(content_encoding: str | None):
+    """
+    Декодер для потоковой распаковки (None — тело не сжато).
+    Вызывать до начала ответа: неизвестная кодировка -> 415, а не строка ошибки в потоке.
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("identity", ""):
+        return None
+    if encoding == "gzip":
+        return _GzipStreamDecoder()
+    if encoding == "zstd" and zstandard is not None:
+        return _ZstdStreamDecoder()
+    raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+
+
+def _decompress_chunk(decoder, chunk: bytes, room: int) -> bytes:
+    try:
+        return decoder.decompress(chunk, room)
+    except (EOFError, zlib.error) as e:
+        raise HTTPException(status_code=400, detail="Malformed compressed body") from e
+    except Exception as e:
+        if zstandard is not None and isinstance(e, zstandard.ZstdError):
+            raise HTTPException(status_code=400, detail="Malformed compressed body") from e
+        raise
+
+
+async def iter_decompressed(request: Request, decoder=None, limit: int | None = None) -> AsyncIterator[bytes]:
+    """
+    Потоковая распаковка тела (для NDJSON): gzip/zstd без буферизации всего запроса.
+    decoder — из stream_decoder. Битое сжатие -> HTTPException 400,
+    распакованное тело больше limit -> 413 (по умолчанию SYNC_STREAM_MAX_BODY_BYTES).
+    """
+    limit = settings.SYNC_STREAM_MAX_BODY_BYTES if limit is None else limit
+    total = 0
+    async for chunk in request.stream():
+        out = chunk if decoder is None else _decompress_chunk(decoder, chunk, limit - total)
+        total += len(out)
+        if total > limit:
+            raise _too_large()
+        if out:
+            yield out
+    if decoder is not None and not decoder.complete:
+        # сжатый поток оборвался посредине
+        raise HTTPException(status_code=400, detail="Malformed compressed body")
+
+
+def _inline_refs(node: Any, defs: dict) -> Any:
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/$defs/"):
+            return _inline_refs(defs[ref.rsplit("/", 1)[-1]], defs)
+        return {k: _inline_refs(v, defs) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_inline_refs(v, defs) for v in node]
+    return node
+
+
+def request_body_openapi(model: type[BaseModel]) -> dict:
+    """
+    openapi_extra для эндпоинтов, которые читают тело сами (read_request_body):
+    FastAPI тогда не видит модель, и схема тела пропадает из OpenAPI.
+    $defs подставляем на место — в документе OpenAPI ссылки #/$defs/... не резолвятся.
+    """
+    schema = model.model_json_schema()
+    schema = _inline_refs(schema, schema.pop("$defs", {}))
+    return {
+        "requestBody": {
+            "required": True,
+            "description": "JSON или MessagePack; Content-Encoding: gzip | zstd",
+            "content": {media_type: {"schema": schema} for media_type in ("application/json", MSGPACK_MEDIA_TYPE)},
+        }
+    }
+
+
+def _compress(body: bytes, accept_encoding: str | None) -> tuple[bytes, str | None]:
+    if len(body) < settings.SYNC_COMPRESS_MIN_BYTES:
+        return body, None
+    accepted = _header_tokens(accept_encoding)
+    # zstd быстрее и плотнее gzip — берём его, если клиент умеет
+    if "zstd" in accepted and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(body), "zstd"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
+
+
+def encode_response(request: Request, model: BaseModel, status_code: int = 200) -> Response:
+    """
+    Сериализует схему в JSON или MessagePack (по Accept) и сжимает по Accept-Encoding.
+    """
+    if msgpack is not None and any(t in MSGPACK_MEDIA_TYPES for t in _header_tokens(request.headers.get("accept"))):
+        body = msgpack.packb(model.model_dump(mode="json"), use_bin_type=True)
+        media_type = MSGPACK_MEDIA_TYPE
+    else:
+        body = model.model_dump_json().encode()
+        media_type = "application/json"
+
+    body, encoding = _compress(body, request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
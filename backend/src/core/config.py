@@ -11,12 +11,72 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     DB_SSLMODE: str = "require"   # prefer | require | verify-full
 
+    # пул соединений (на процесс и на движок: sync и async считаются отдельно)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    # pre-ping на каждый checkout дорог; по умолчанию пингуем только долго простаивавшие соединения
+    DB_POOL_PRE_PING: bool = False
+    DB_PING_IDLE_SECONDS: int = 60
+
+    # реплики для чтения (через запятую, пусто — всё на primary) и окно read-your-writes после записи
+    DATABASE_REPLICA_URLS: str = ""
+    READ_YOUR_WRITES_SECONDS: int = 5
+
+    # счётчик SQL-запросов на HTTP-запрос (заголовки X-DB-*, /internal/db/queries);
+    # одинаковый statement повторился столько раз за запрос — помечаем как вероятный N+1
+    QUERY_STATS_ENABLED: bool = False
+    QUERY_STATS_N_PLUS_ONE_THRESHOLD: int = 5
+
     JWT_SECRET: str
     JWT_ALG: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+
+    # кэш пользователя по subject токена: сколько живёт запись и сколько записей держим
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+
+    # кэш шаблонов чек-листов: как часто сверяем версию в cache_versions (другие воркеры увидят правку не позже)
+    TEMPLATE_CACHE_CHECK_SECONDS: float = 5.0
 
     LOGIN_MAX_ATTEMPTS: int = 5
     LOGIN_LOCK_MINUTES: int = 15
+    # где считаем неудачные входы: "" / memory:// — в памяти процесса, redis://... — общий стор
+    LOGIN_LIMITER_URL: str = ""
+
+    # отдельный пул для bcrypt: размер, длина очереди и сколько ждём результата
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
+    PASSWORD_HASH_TIMEOUT_SECONDS: float = 10.0
+
+    # /sync/batch/stream: сколько ops применяем за одну транзакцию, максимальная длина строки NDJSON
+    # и лимит распакованного тела целиком
+    SYNC_STREAM_CHUNK_SIZE: int = 200
+    SYNC_STREAM_MAX_LINE_BYTES: int = 64 * 1024
+    SYNC_STREAM_MAX_BODY_BYTES: int = 512 * 1024 * 1024
+
+    # /sync/batch: пачки больше порога уходят в фоновую очередь (202 + job id);
+    # лимиты ожидающих job (в процессе и на пользователя); процесс-владелец отмечается
+    # heartbeat раз в SYNC_JOB_HEARTBEAT_SECONDS, без отметки дольше SYNC_JOB_ORPHAN_SECONDS job брошена
+    SYNC_ASYNC_THRESHOLD_OPS: int = 200
+    SYNC_JOB_WORKERS: int = 2
+    SYNC_JOB_MAX_PENDING: int = 20
+    SYNC_JOB_MAX_PENDING_PER_USER: int = 3
+    SYNC_JOB_HEARTBEAT_SECONDS: float = 15.0
+    SYNC_JOB_ORPHAN_SECONDS: int = 60
+
+    # сжатие/MessagePack для sync: лимит распакованного тела и порог, ниже которого ответ не сжимаем
+    SYNC_MAX_BODY_BYTES: int = 32 * 1024 * 1024
+    SYNC_COMPRESS_MIN_BYTES: int = 1024
+
+    # operation_log: окно идемпотентности, срок хранения, партиции (только PostgreSQL) и архив
+    OPLOG_IDEMPOTENCY_DAYS: int = 30
+    OPLOG_RETENTION_DAYS: int = 90
+    OPLOG_PARTITIONING: bool = True
+    OPLOG_PARTITIONS_AHEAD: int = 2
+    OPLOG_ARCHIVE_DIR: str = "./archive/oplog"
 
     @property
     def cors_origins_list(self) -> List[str]:
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from src.core.config import settings
+
+try:
+    import redis
+except ImportError:  # общий стор опционален: без redis работает только in-memory
+    redis = None
+
+
+class AttemptLimiter(ABC):
+    """
+    Счётчик неудачных входов по ключу (email). Ничего не пишет в БД:
+    наружу отдаёт только факт срабатывания блокировки.
+    """
+
+    def __init__(self, max_attempts: int, lock_seconds: int):
+        self.max_attempts = max_attempts
+        self.lock_seconds = lock_seconds
+
+    @abstractmethod
+    def locked_for(self, key: str) -> int:
+        """Сколько секунд ещё действует блокировка (0 — не заблокирован)."""
+
+    @abstractmethod
+    def register_failure(self, key: str) -> bool:
+        """Учитывает неудачу; True — если именно она включила блокировку."""
+
+    @abstractmethod
+    def reset(self, key: str) -> None:
+        """Сбрасывает счётчик и блокировку (успешный вход)."""
+
+
+class InMemoryAttemptLimiter(AttemptLimiter):
+    """
+    Счётчики в памяти процесса (LRU, не больше maxsize ключей).
+    Окно подсчёта неудач равно длительности блокировки.
+    """
+
+    def __init__(self, max_attempts: int, lock_seconds: int, maxsize: int = 100_000):
+        super().__init__(max_attempts, lock_seconds)
+        self.maxsize = maxsize
+        # key -> (неудач в окне, начало окна, заблокирован до)
+        self._data: OrderedDict[str, tuple[int, float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def locked_for(self, key: str) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[2] <= now:
+                return 0
+            return int(entry[2] - now) + 1
+
+    def register_failure(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            failures, started, locked_until = self._data.get(key, (0, now, 0.0))
+            if now - started > self.lock_seconds:
+                failures, started = 0, now
+            failures += 1
+            triggered = failures >= self.max_attempts
+            if triggered:
+                failures, started, locked_until = 0, now, now + self.lock_seconds
+            self._data[key] = (failures, started, locked_until)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return triggered
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisAttemptLimiter(AttemptLimiter):
+    """Общий для всех воркеров счётчик в Redis: INCR с TTL окна и отдельный ключ блокировки."""
+
+    def __init__(self, url: str, max_attempts: int, lock_seconds: int, prefix: str = "login"):
+        if redis is None:
+            raise RuntimeError("LOGIN_LIMITER_URL указывает на redis, но пакет redis не установлен")
+        super().__init__(max_attempts, lock_seconds)
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _fail_key(self, key: str) -> str:
+        return f"{self.prefix}:fail:{key}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"{self.prefix}:lock:{key}"
+
+    def locked_for(self, key: str) -> int:
+        ttl = self.client.ttl(self._lock_key(key))
+        return max(int(ttl), 0)
+
+    def register_failure(self, key: str) -> bool:
+        fail_key = self._fail_key(key)
+        failures = int(self.client.incr(fail_key))
+        if failures == 1:
+            # окно начинается с первой неудачи
+            self.client.expire(fail_key, self.lock_seconds)
+        if failures < self.max_attempts:
+            return False
+        pipe = self.client.pipeline()
+        pipe.set(self._lock_key(key), 1, ex=self.lock_seconds)
+        pipe.delete(fail_key)
+        pipe.execute()
+        return True
+
+    def reset(self, key: str) -> None:
+        self.client.delete(self._fail_key(key), self._lock_key(key))
+
+
+def build_login_limiter(url: str) -> AttemptLimiter:
+    max_attempts = settings.LOGIN_MAX_ATTEMPTS
+    lock_seconds = settings.LOGIN_LOCK_MINUTES * 60
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisAttemptLimiter(url, max_attempts, lock_seconds)
+    if url and url != "memory://":
+        raise RuntimeError(f"Неизвестный LOGIN_LIMITER_URL: {url}")
+    return InMemoryAttemptLimiter(max_attempts, lock_seconds)
+
+
+login_limiter = build_login_limiter(settings.LOGIN_LIMITER_URL)
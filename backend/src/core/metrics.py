@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Sequence
+
+# границы корзин гистограммы, мс
+DEFAULT_BUCKETS_MS: tuple[float, ...] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """
+    Потокобезопасная гистограмма задержек с фиксированными корзинами.
+    Квантили приблизительные (верхняя граница корзины), зато observe() — O(log корзин) без аллокаций.
+    """
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self._buckets = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(self._buckets) + 1)  # последняя — +Inf
+            self._count = 0
+            self._sum_ms = 0.0
+            self._max_ms = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        idx = bisect_left(self._buckets, value_ms)
+        with self._lock:
+            self._counts[idx] += 1
+            self._count += 1
+            self._sum_ms += value_ms
+            if value_ms > self._max_ms:
+                self._max_ms = value_ms
+
+    def _quantile(self, counts: list[int], total: int, q: float) -> float:
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for idx, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return float(self._buckets[idx]) if idx < len(self._buckets) else self._max_ms
+        return self._max_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total, sum_ms, max_ms = self._count, self._sum_ms, self._max_ms
+        labels = [f"le_{b:g}ms" for b in self._buckets] + ["le_inf"]
+        return {
+            "count": total,
+            "sum_ms": round(sum_ms, 3),
+            "avg_ms": round(sum_ms / total, 3) if total else 0.0,
+            "max_ms": round(max_ms, 3),
+            "p50_ms": self._quantile(counts, total, 0.50),
+            "p95_ms": self._quantile(counts, total, 0.95),
+            "p99_ms": self._quantile(counts, total, 0.99),
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class LabeledLatency:
+    """
+    Набор гистограмм + счётчиков ошибок по метке (action, route и т.п.).
+    """
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self._buckets = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self._latency: dict[str, LatencyHistogram] = {}
+        self._errors: dict[str, int] = {}
+
+    def _histogram(self, label: str) -> LatencyHistogram:
+        h = self._latency.get(label)
+        if h is None:
+            with self._lock:
+                h = self._latency.setdefault(label, LatencyHistogram(self._buckets))
+                self._errors.setdefault(label, 0)
+        return h
+
+    def observe(self, label: str, value_ms: float, error: bool = False) -> None:
+        self._histogram(label).observe(value_ms)
+        if error:
+            with self._lock:
+                self._errors[label] += 1
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            items = list(self._latency.items())
+            errors = dict(self._errors)
+        return {label: {**h.snapshot(), "errors": errors.get(label, 0)} for label, h in items}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._latency.clear()
+            self._errors.clear()
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def encode_cursor(ts: datetime, id: int) -> str:
+    """Непрозрачный курсор keyset-пагинации: позиция (updated_at, id) последней строки страницы."""
+    raw = json.dumps([ts.isoformat(), id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, id = json.loads(raw)
+        return datetime.fromisoformat(ts), int(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
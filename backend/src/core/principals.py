@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.models.user import User, UserRole
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    То, что нужно обработчикам о текущем пользователе (id, роль, организация, активность).
+    Лёгкая замена ORM User из get_current_user: кэшируется между запросами
+    и не привязана к сессии.
+    """
+    id: int
+    email: str
+    role: UserRole
+    organization_id: Optional[int]
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            organization_id=user.organization_id,
+            is_active=user.is_active,
+        )
+
+
+# ключ — subject токена (email)
+principal_cache: TTLCache[Principal] = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_principal(*emails: Optional[str]) -> None:
+    """
+    Сбрасывает закэшированного пользователя в этом процессе; в остальных воркерах
+    запись доживёт максимум PRINCIPAL_CACHE_TTL_SECONDS.
+    """
+    principal_cache.invalidate(*(e for e in emails if e))
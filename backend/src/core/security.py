@@ -1,9 +1,62 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
 from passlib.context import CryptContext
 
+from src.core.config import settings
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt — чистый CPU. Считаем его в отдельном маленьком пуле (bcrypt отпускает GIL),
+# чтобы волна логинов в начале смены не съедала воркеры синка и карточек пациентов.
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+# слоты = считающиеся + ждущие в очереди; когда кончились — отказываем сразу (backpressure)
+_hash_slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE)
+
+
+class PasswordHasherBusy(Exception):
+    """Очередь хеширования переполнена — клиенту стоит повторить позже (503 + Retry-After)."""
+
+
+def _submit(fn, *args, wait: bool) -> Future:
+    acquired = _hash_slots.acquire(timeout=settings.PASSWORD_HASH_TIMEOUT_SECONDS) if wait else _hash_slots.acquire(blocking=False)
+    if not acquired:
+        raise PasswordHasherBusy()
+    try:
+        future = _hash_executor.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return future
+
+
+def _run_sync(fn, *args):
+    future = _submit(fn, *args, wait=True)
+    try:
+        return future.result(timeout=settings.PASSWORD_HASH_TIMEOUT_SECONDS)
+    except TimeoutError as e:
+        raise PasswordHasherBusy() from e
+
+
+async def _run_async(fn, *args):
+    # event loop не блокируем: ни ожиданием слота, ни самим хешированием
+    future = _submit(fn, *args, wait=False)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=settings.PASSWORD_HASH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError as e:
+        raise PasswordHasherBusy() from e
+
+
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return _run_sync(pwd_context.hash, password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
\ No newline at end of file
+    return _run_sync(pwd_context.verify, password, hashed)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_async(pwd_context.hash, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await _run_async(pwd_context.verify, password, hashed)
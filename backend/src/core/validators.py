@@ -29,4 +29,8 @@ def validate_snils(snils: str) -> str:
     if checksum != calc:
         raise ValueError("Invalid SNILS checksum")
 
-    return digits
\ No newline at end of file
+    return digits
+
+def normalize_polis(polis: str) -> str:
+    # полис ОМС: без пробелов/дефисов, буквы серии старых полисов — в верхнем регистре
+    return re.sub(r"[\s\-]+", "", polis or "").upper()
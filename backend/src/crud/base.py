@@ -1,11 +1,36 @@
 from typing import Any, Generic, Optional, Type, TypeVar
+from fastapi import HTTPException
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
 ModelT = TypeVar("ModelT")
 CreateSchemaT = TypeVar("CreateSchemaT", bound=BaseModel)
 UpdateSchemaT = TypeVar("UpdateSchemaT", bound=BaseModel)
 
+def commit_or_conflict(db: Session, commit: bool = True) -> None:
+    """
+    commit для моделей с version_id_col: если строку успели изменить параллельно — 409.
+    commit=False — только flush (commit делает вызывающий вместе с остальными записями).
+    """
+    try:
+        if commit:
+            db.commit()
+        else:
+            db.flush()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Record was modified concurrently, reload and retry")
+
+async def acommit_or_conflict(db: AsyncSession) -> None:
+    """Async-вариант commit_or_conflict."""
+    try:
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Record was modified concurrently, reload and retry")
+
 class CRUDBase(Generic[ModelT, CreateSchemaT, UpdateSchemaT]):
     def __init__(self, model: Type[ModelT]):
         self.model = model
@@ -13,20 +38,24 @@ class CRUDBase(Generic[ModelT, CreateSchemaT, UpdateSchemaT]):
     def get(self, db: Session, id: Any) -> Optional[ModelT]:
         return db.get(self.model, id)
 
-    def create(self, db: Session, obj_in: CreateSchemaT) -> ModelT:
+    def create(self, db: Session, obj_in: CreateSchemaT, commit: bool = True) -> ModelT:
         obj = self.model(**obj_in.model_dump())
         db.add(obj)
+        if not commit:
+            db.flush()
+            return obj
         db.commit()
         db.refresh(obj)
         return obj
 
-    def update(self, db: Session, db_obj: ModelT, obj_in: UpdateSchemaT) -> ModelT:
+    def update(self, db: Session, db_obj: ModelT, obj_in: UpdateSchemaT, commit: bool = True) -> ModelT:
         data = obj_in.model_dump(exclude_unset=True)
         for k, v in data.items():
             setattr(db_obj, k, v)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        commit_or_conflict(db, commit=commit)
+        if commit:
+            db.refresh(db_obj)
         return db_obj
 
     def remove(self, db: Session, id: Any) -> Optional[ModelT]:
@@ -35,4 +64,33 @@ class CRUDBase(Generic[ModelT, CreateSchemaT, UpdateSchemaT]):
             return None
         db.delete(obj)
         db.commit()
-        return obj
\ No newline at end of file
+        return obj
+
+    # --- async-варианты для эндпоинтов на AsyncSession (src.db.async_session) ---
+
+    async def aget(self, db: AsyncSession, id: Any) -> Optional[ModelT]:
+        return await db.get(self.model, id)
+
+    async def acreate(self, db: AsyncSession, obj_in: CreateSchemaT) -> ModelT:
+        obj = self.model(**obj_in.model_dump())
+        db.add(obj)
+        await db.commit()
+        await db.refresh(obj)
+        return obj
+
+    async def aupdate(self, db: AsyncSession, db_obj: ModelT, obj_in: UpdateSchemaT) -> ModelT:
+        data = obj_in.model_dump(exclude_unset=True)
+        for k, v in data.items():
+            setattr(db_obj, k, v)
+        db.add(db_obj)
+        await acommit_or_conflict(db)
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def aremove(self, db: AsyncSession, id: Any) -> Optional[ModelT]:
+        obj = await db.get(self.model, id)
+        if not obj:
+            return None
+        await db.delete(obj)
+        await db.commit()
+        return obj
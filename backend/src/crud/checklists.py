@@ -2,8 +2,9 @@ from __future__ import annotations
 
 from typing import Optional, Sequence
 
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import desc, select
 
 from src.crud.base import CRUDBase
 from src.models.checklist import ChecklistTemplate, ChecklistItemTemplate
@@ -74,6 +75,24 @@ class CRUDPatientChecklist(CRUDBase[PatientChecklist, PatientChecklistCreate, Pa
             .first()
         )
 
+    def get_latest_for_patient_with_items(self, db: Session, patient_id: int) -> Optional[PatientChecklist]:
+        # 2 запроса: шапка, затем items вместе с шаблонами пунктов (JOIN)
+        return (
+            db.query(PatientChecklist)
+            .options(selectinload(PatientChecklist.items).joinedload(PatientChecklistItem.item_template))
+            .filter(PatientChecklist.patient_id == patient_id)
+            .order_by(PatientChecklist.id.desc())
+            .first()
+        )
+
+    async def aget_latest_for_patient(self, db: AsyncSession, patient_id: int) -> Optional[PatientChecklist]:
+        return await db.scalar(
+            select(PatientChecklist)
+            .where(PatientChecklist.patient_id == patient_id)
+            .order_by(PatientChecklist.id.desc())
+            .limit(1)
+        )
+
 
 class CRUDPatientChecklistItem(CRUDBase[PatientChecklistItem, PatientChecklistItemCreate, PatientChecklistItemUpdate]):
     def list_for_checklist(self, db: Session, patient_checklist_id: int) -> Sequence[PatientChecklistItem]:
@@ -94,6 +113,14 @@ class CRUDPatientChecklistItem(CRUDBase[PatientChecklistItem, PatientChecklistIt
             .one_or_none()
         )
 
+    async def aget_for_checklist(self, db: AsyncSession, patient_checklist_id: int, item_id: int) -> Optional[PatientChecklistItem]:
+        return await db.scalar(
+            select(PatientChecklistItem).where(
+                PatientChecklistItem.patient_checklist_id == patient_checklist_id,
+                PatientChecklistItem.id == item_id,
+            )
+        )
+
 
 template_crud = CRUDChecklistTemplate(ChecklistTemplate)
 template_item_crud = CRUDChecklistItemTemplate(ChecklistItemTemplate)
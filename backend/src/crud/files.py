@@ -1,5 +1,7 @@
 from __future__ import annotations
 from typing import Optional, Sequence
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from src.crud.base import CRUDBase
 from src.models.file_asset import FileAsset
@@ -9,6 +11,12 @@ class CRUDFiles(CRUDBase):
     def list_for_patient(self, db: Session, patient_id: int) -> Sequence[FileAsset]:
         return db.query(FileAsset).filter(FileAsset.patient_id == patient_id).order_by(FileAsset.id.desc()).all()
 
+    async def alist_for_patient(self, db: AsyncSession, patient_id: int) -> Sequence[FileAsset]:
+        res = await db.scalars(
+            select(FileAsset).where(FileAsset.patient_id == patient_id).order_by(FileAsset.id.desc())
+        )
+        return res.all()
+
     def list_for_checklist_item(self, db: Session, checklist_item_id: int) -> Sequence[FileAsset]:
         return db.query(FileAsset).filter(FileAsset.checklist_item_id == checklist_item_id).order_by(FileAsset.id.desc()).all()
 
@@ -1,21 +1,46 @@
-from sqlalchemy.orm import Session
+from datetime import datetime
+
+from sqlalchemy import String, literal, tuple_
+from sqlalchemy.orm import Query, Session
 from src.crud.base import CRUDBase
 from src.models.patient import Patient
 from src.schemas.patient import PatientCreate, PatientUpdate
 
+
+def _ts_param(db: Session, ts: datetime):
+    # SQLite хранит DateTime строкой: CURRENT_TIMESTAMP — без микросекунд, а bind-параметр всегда с ними.
+    # Чтобы равенство в keyset-условии срабатывало, отдаём значение в том виде, в каком оно лежит в таблице.
+    if db.get_bind().dialect.name == "sqlite":
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if ts.microsecond else "%Y-%m-%d %H:%M:%S"
+        return literal(ts.strftime(fmt), String)
+    return ts
+
+
 class CRUDPatient(CRUDBase[Patient, PatientCreate, PatientUpdate]):
-    def list(self, db: Session, status=None, limit: int = 50, offset: int = 0):
+    def _page(self, db: Session, q: Query, limit: int, offset: int, cursor: tuple[datetime, int] | None):
+        """
+        Сортировка (updated_at DESC, id DESC). С курсором — keyset: WHERE (updated_at, id) < курсор,
+        стоимость страницы не зависит от глубины (индексы ix_patients_*_updated).
+        Без курсора — старый OFFSET для совместимости.
+        """
+        if cursor is not None:
+            ts, last_id = cursor
+            q = q.filter(tuple_(Patient.updated_at, Patient.id) < tuple_(_ts_param(db, ts), last_id))
+            offset = 0
+        return q.order_by(Patient.updated_at.desc(), Patient.id.desc()).offset(offset).limit(limit).all()
+
+    def list(self, db: Session, status=None, limit: int = 50, offset: int = 0, cursor: tuple[datetime, int] | None = None):
         q = db.query(Patient)
         if status is not None:
             q = q.filter(Patient.status == status)
-        return q.order_by(Patient.updated_at.desc()).offset(offset).limit(limit).all()
+        return self._page(db, q, limit, offset, cursor)
 
-    def list_for_org(self, db: Session, org_id: int | None, status=None, limit: int = 50, offset: int = 0):
+    def list_for_org(self, db: Session, org_id: int | None, status=None, limit: int = 50, offset: int = 0, cursor: tuple[datetime, int] | None = None):
         if org_id is None:
             return []
         q = db.query(Patient).filter(Patient.organization_id == org_id)
         if status is not None:
             q = q.filter(Patient.status == status)
-        return q.order_by(Patient.updated_at.desc()).offset(offset).limit(limit).all()
+        return self._page(db, q, limit, offset, cursor)
 
-patient_crud = CRUDPatient(Patient)
\ No newline at end of file
+patient_crud = CRUDPatient(Patient)
@@ -4,7 +4,14 @@ from sqlalchemy.orm import Session
 from src.crud.base import CRUDBase
 from src.models.user import User
 from src.schemas.user import UserCreate, UserUpdate
-from src.core.security import hash_password
+from src.core.security import hash_password, PasswordHasherBusy
+from src.core.principals import invalidate_principal
+
+def _hash_or_503(password: str) -> str:
+    try:
+        return hash_password(password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Password hashing is busy, retry later", headers={"Retry-After": "1"})
 
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
     def create(self, db: Session, obj_in: UserCreate) -> User:
@@ -12,7 +19,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             raise HTTPException(status_code=400, detail="Email already registered")
         data = obj_in.model_dump()
         password = data.pop("password")
-        data["hashed_password"] = hash_password(password)
+        data["hashed_password"] = _hash_or_503(password)
         obj = User(**data)
         db.add(obj)
         db.commit()
@@ -20,14 +27,17 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         return obj
 
     def update(self, db: Session, db_obj: User, obj_in: UserUpdate) -> User:
+        old_email = db_obj.email
         data = obj_in.model_dump(exclude_unset=True)
         if "password" in data and data["password"]:
-            db_obj.hashed_password = hash_password(data.pop("password"))
+            db_obj.hashed_password = _hash_or_503(data.pop("password"))
         for k, v in data.items():
             setattr(db_obj, k, v)
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        # роль/организация/активность могли поменяться — не ждём истечения TTL
+        invalidate_principal(old_email, db_obj.email)
         return db_obj
 
 user_crud = CRUDUser(User)
\ No newline at end of file
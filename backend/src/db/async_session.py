@@ -0,0 +1,65 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.db.change_tracking import track_changes
+from src.db.pool import pool_kwargs, install_idle_ping
+
+
+def async_url(url: str):
+    """
+    Тот же DATABASE_URL, но с async-драйвером: psycopg (v3) для PostgreSQL, aiosqlite для SQLite.
+    """
+    u = make_url(url)
+    if u.get_backend_name() == "postgresql":
+        return u.set(drivername="postgresql+psycopg")
+    if u.get_backend_name() == "sqlite":
+        return u.set(drivername="sqlite+aiosqlite")
+    return u
+
+
+connect_args = {}
+
+if settings.DATABASE_URL.startswith("postgresql"):
+    connect_args["sslmode"] = settings.DB_SSLMODE
+
+async_engine = create_async_engine(
+    async_url(settings.DATABASE_URL),
+    echo=False,
+    connect_args=connect_args,
+    **pool_kwargs(settings.DATABASE_URL, is_async=True),
+)
+install_idle_ping(async_engine.sync_engine)
+
+if async_engine.dialect.name == "sqlite":
+    # те же хуки, что и для sync-движка (см. src/db/session.py)
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _sqlite_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(async_engine.sync_engine, "begin")
+    def _sqlite_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+class AsyncSyncSession(Session):
+    """Sync-сессия внутри AsyncSession: на неё подписан журнал изменений."""
+
+
+track_changes(AsyncSyncSession)
+
+# expire_on_commit=False: после commit атрибуты нельзя лениво догружать в async-коде
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=AsyncSyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
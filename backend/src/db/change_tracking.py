@@ -0,0 +1,150 @@
+"""
+Журнал изменений для /sync/changes (таблица sync_changes).
+
+ORM-изменения пишутся автоматически: after_flush смотрит new/dirty/deleted сессии.
+Мимо unit of work идут:
+- Core update()/delete() (счётчики чек-листа, условное переключение done и т.п.) —
+  такие места сами вызывают record_changes в той же транзакции;
+- ON DELETE CASCADE / SET NULL в БД (passive_deletes): удалённого пациента/чек-лист ORM
+  не разворачивает в дочерние строки, поэтому before_flush заранее выбирает их id
+  и after_flush пишет их вместе с остальными.
+Правки в обход приложения (ручной SQL, миграции) в журнал не попадают.
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm.util import identity_key
+
+from src.models.patient import Patient
+from src.models.patient_checklist import PatientChecklist, PatientChecklistItem
+from src.models.blood_labs import BloodLabPanel
+from src.models.file_asset import FileAsset
+from src.models.sync_change import SyncChange
+
+# сколько id отправляем в один IN (...) в record_changes
+RECORD_CHUNK_SIZE = 1000
+
+# какие модели попадают в /sync/changes и под каким именем
+TRACKED_ENTITIES = {
+    Patient: "patient",
+    PatientChecklist: "checklist",
+    PatientChecklistItem: "checklist_item",
+    BloodLabPanel: "blood_labs",
+    FileAsset: "file",
+}
+
+
+def _patient_id(session: Session, obj) -> int | None:
+    if isinstance(obj, Patient):
+        return obj.id
+    if isinstance(obj, PatientChecklistItem):
+        checklist = session.identity_map.get(identity_key(PatientChecklist, obj.patient_checklist_id))
+        if checklist is not None:
+            return checklist.patient_id
+        return session.connection().scalar(
+            select(PatientChecklist.patient_id).where(PatientChecklist.id == obj.patient_checklist_id)
+        )
+    return obj.patient_id
+
+
+def _organization_id(session: Session, obj, patient_id: int | None) -> int | None:
+    if isinstance(obj, Patient):
+        return obj.organization_id
+    if patient_id is None:
+        return None
+    patient = session.identity_map.get(identity_key(Patient, patient_id))
+    if patient is not None:
+        return patient.organization_id
+    return session.connection().scalar(select(Patient.organization_id).where(Patient.id == patient_id))
+
+
+def _scope_select(model):
+    # id сущности + patient_id/organization_id для фильтрации ленты по организации
+    if model is Patient:
+        return select(Patient.id, Patient.id.label("patient_id"), Patient.organization_id)
+    if model is PatientChecklistItem:
+        return (
+            select(PatientChecklistItem.id, PatientChecklist.patient_id, Patient.organization_id)
+            .join(PatientChecklist, PatientChecklistItem.patient_checklist_id == PatientChecklist.id)
+            .outerjoin(Patient, PatientChecklist.patient_id == Patient.id)
+        )
+    return select(model.id, model.patient_id, Patient.organization_id).outerjoin(Patient, model.patient_id == Patient.id)
+
+
+def _scope_rows(session: Session, model, condition, deleted: bool) -> list[dict]:
+    entity = TRACKED_ENTITIES[model]
+    return [
+        {
+            "entity": entity,
+            "entity_id": r.id,
+            "deleted": deleted,
+            "patient_id": r.patient_id,
+            "organization_id": r.organization_id,
+        }
+        for r in session.connection().execute(_scope_select(model).where(condition))
+    ]
+
+
+def record_changes(session: Session, model, ids: Iterable[int], deleted: bool = False) -> None:
+    """
+    Запись в sync_changes для изменений мимо unit of work (Core update()/delete()):
+    after_flush их не видит. Вызывать в той же транзакции, что и саму запись.
+    """
+    ids = sorted(set(ids))
+    # кусками: rebuild-checklist-counters может затронуть все чек-листы сразу
+    for i in range(0, len(ids), RECORD_CHUNK_SIZE):
+        rows = _scope_rows(session, model, model.id.in_(ids[i:i + RECORD_CHUNK_SIZE]), deleted)
+        if rows:
+            session.connection().execute(insert(SyncChange), rows)
+
+
+def _before_flush(session: Session, flush_context, instances) -> None:
+    # дочерние строки, которые БД удалит (или отвяжет) каскадом, — выбираем, пока они ещё есть
+    cascaded: list[dict] = []
+    for obj in session.deleted:
+        if isinstance(obj, Patient):
+            cascaded += _scope_rows(session, PatientChecklist, PatientChecklist.patient_id == obj.id, True)
+            cascaded += _scope_rows(session, PatientChecklistItem, PatientChecklist.patient_id == obj.id, True)
+            cascaded += _scope_rows(session, FileAsset, FileAsset.patient_id == obj.id, True)
+        elif isinstance(obj, PatientChecklist):
+            cascaded += _scope_rows(session, PatientChecklistItem, PatientChecklistItem.patient_checklist_id == obj.id, True)
+        elif isinstance(obj, PatientChecklistItem):
+            # файлы остаются, но теряют checklist_item_id (ON DELETE SET NULL)
+            cascaded += _scope_rows(session, FileAsset, FileAsset.checklist_item_id == obj.id, False)
+    # перезаписываем, а не дописываем: после неудачного flush старый список не нужен
+    session.info["sync_cascaded_changes"] = cascaded
+
+
+def _after_flush(session: Session, flush_context) -> None:
+    changed = [(obj, False) for obj in session.new]
+    changed += [(obj, False) for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    changed += [(obj, True) for obj in session.deleted]
+
+    rows = session.info.pop("sync_cascaded_changes", [])
+    for obj, deleted in changed:
+        entity = TRACKED_ENTITIES.get(type(obj))
+        if entity is None:
+            continue
+        patient_id = _patient_id(session, obj)
+        rows.append({
+            "entity": entity,
+            "entity_id": obj.id,
+            "deleted": deleted,
+            "patient_id": patient_id,
+            "organization_id": _organization_id(session, obj, patient_id),
+        })
+
+    if rows:
+        # пишем в той же транзакции (и том же SAVEPOINT), что и сами изменения
+        session.connection().execute(insert(SyncChange), rows)
+
+
+def track_changes(session_factory: sessionmaker | type[Session]) -> None:
+    """
+    Подписывает фабрику (или класс) сессий на запись изменений в sync_changes после каждого flush.
+    """
+    event.listen(session_factory, "before_flush", _before_flush)
+    event.listen(session_factory, "after_flush", _after_flush)
@@ -1,6 +1,77 @@
-from src.db.session import engine
+import logging
+
+from sqlalchemy import Table, inspect, text
+
+from src.db.session import engine, SessionLocal
 from src.db.base import Base
 import src.db.models  # важно: чтобы метадата увидела все таблицы
+from src.models.oplog import OperationLog
+from src.models.patient import Patient
+from src.models.patient_checklist import PatientChecklist
+from src.models.sync_change import SyncChange
+from src.models.sync_job import SyncJob
+from src.services.checklist_service import rebuild_checklist_counters
+from src.services.oplog_retention import create_partitioned_table
+from src.services.patient_search import ensure_search_indexes, normalize_patient_identifiers
+from src.services.template_cache import ensure_templates_version
+
+logger = logging.getLogger(__name__)
+
+
+def _add_missing_columns(table: Table, names: tuple[str, ...]) -> list[str]:
+    """
+    create_all не добавляет колонки в существующие таблицы — досоздаём сами.
+    NOT NULL-колонки — только с server_default (существующие строки получают default).
+    SQLite не умеет ADD COLUMN IF NOT EXISTS, поэтому сначала смотрим в inspector.
+    """
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    missing = [name for name in names if name not in existing]
+    if_not_exists = "IF NOT EXISTS " if engine.dialect.name == "postgresql" else ""
+    with engine.begin() as conn:
+        for name in missing:
+            column = table.c[name]
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {if_not_exists}{name} {column.type.compile(engine.dialect)}"
+            if not column.nullable:
+                ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+            conn.execute(text(ddl))
+    if missing:
+        logger.info("init_db: added %s.%s", table.name, ", ".join(missing))
+    return missing
+
 
 def init_db() -> None:
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    # сначала всё, кроме operation_log: у неё FK на users, а на PostgreSQL она партиционированная
+    Base.metadata.create_all(
+        bind=engine,
+        tables=[t for t in Base.metadata.sorted_tables if t.name != OperationLog.__tablename__],
+    )
+    create_partitioned_table(engine)
+    # на SQLite (или без партиционирования) operation_log создастся здесь обычной таблицей
+    Base.metadata.create_all(bind=engine)
+
+    # optimistic locking: version для таблиц, созданных до его появления (старые строки -> 1)
+    _add_missing_columns(Patient.__table__, ("version",))
+    _add_missing_columns(PatientChecklist.__table__, ("version",))
+
+    # счётчики прогресса в старой таблице: колонки появились с нулями — сразу пересчитываем
+    if _add_missing_columns(PatientChecklist.__table__, ("done_count", "total_count")):
+        with SessionLocal() as db:
+            rebuild_checklist_counters(db)
+
+    # владелец фоновой job (старые queued/running без heartbeat сразу считаются брошенными)
+    _add_missing_columns(SyncJob.__table__, ("worker_id", "heartbeat_at"))
+
+    # курсор /sync/changes: старые строки публикуем с seq = id, чтобы сохранённые клиентами курсоры остались верны
+    if _add_missing_columns(SyncChange.__table__, ("seq",)):
+        with engine.begin() as conn:
+            conn.execute(text(f"UPDATE {SyncChange.__tablename__} SET seq = id"))
+
+    # create_all не досоздаёт индексы в уже существующих таблицах (keyset-пагинация patients, sync_changes, sync_jobs)
+    for index in (*Patient.__table__.indexes, *SyncChange.__table__.indexes, *SyncJob.__table__.indexes):
+        index.create(bind=engine, checkfirst=True)
+    ensure_search_indexes(engine)
+    # snils/polis, записанные до нормализации, — иначе поиск по идентификатору их не находит
+    with SessionLocal() as db:
+        normalize_patient_identifiers(db)
+        # строка версии кэша шаблонов: дальше bump_templates_version — один UPDATE
+        ensure_templates_version(db)
@@ -8,4 +8,9 @@ from src.models.patient_checklist import PatientChecklist, PatientChecklistItem
 from src.models.file_asset import FileAsset
 
 from src.models.iol_calc import IOLCalculation
-from src.models.blood_labs import BloodLabPanel
\ No newline at end of file
+from src.models.blood_labs import BloodLabPanel
+
+from src.models.sync_change import SyncChange
+from src.models.sync_job import SyncJob
+from src.models.refresh_token import RefreshToken
+from src.models.cache_version import CacheVersion
\ No newline at end of file
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from src.core.config import settings
+from src.core.metrics import LatencyHistogram
+
+# сколько ждали свободное соединение, мс: мелкие корзины — обычный случай, крупные — очередь
+WAIT_BUCKETS_MS: tuple[float, ...] = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 30000)
+
+
+class PoolStats:
+    """Время ожидания checkout и число таймаутов для одного пула (в этом процессе)."""
+
+    def __init__(self):
+        self.wait = LatencyHistogram(WAIT_BUCKETS_MS)
+        self._lock = threading.Lock()
+        self.timeouts = 0
+        self.pings = 0
+        self.ping_failures = 0
+
+    def inc(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+class _InstrumentedMixin:
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.inc("timeouts")
+            raise
+        finally:
+            self.stats.wait.observe((time.perf_counter() - started) * 1000)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedMixin, QueuePool):
+    """QueuePool, который меряет ожидание свободного соединения."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedMixin, AsyncAdaptedQueuePool):
+    """То же для async-движка."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+
+def pool_kwargs(url: str, is_async: bool = False) -> dict:
+    """
+    Параметры пула из Settings. Для SQLite оставляем пул по умолчанию:
+    там нет сетевых соединений, которые надо ограничивать или проверять.
+    """
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def install_idle_ping(engine: Engine) -> None:
+    """
+    Вместо pre-ping на каждый checkout: пингуем только соединения, пролежавшие в пуле
+    дольше DB_PING_IDLE_SECONDS. Мёртвое соединение -> DisconnectionError,
+    и пул прозрачно берёт/открывает другое.
+    """
+    if settings.DB_POOL_PRE_PING or settings.DB_PING_IDLE_SECONDS <= 0:
+        return
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < settings.DB_PING_IDLE_SECONDS:
+            return
+        stats = getattr(engine.pool, "stats", None)
+        if stats:
+            stats.inc("pings")
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception as e:
+            if stats:
+                stats.inc("ping_failures")
+            raise exc.DisconnectionError() from e
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
+def pool_snapshot(engine: Engine) -> dict:
+    pool = engine.pool
+    out: dict = {"pool_class": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        out.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout_s": pool.timeout(),
+        })
+    stats = getattr(pool, "stats", None)
+    if stats:
+        out.update({
+            "wait": stats.wait.snapshot(),
+            "timeouts": stats.timeouts,
+            "pings": stats.pings,
+            "ping_failures": stats.ping_failures,
+        })
+    return out
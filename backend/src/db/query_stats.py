@@ -0,0 +1,142 @@
+"""
+Счётчик SQL-запросов на HTTP-запрос (включается QUERY_STATS_ENABLED).
+
+Слушаем cursor-события всех движков (sync, async, реплики) и копим в объект текущего
+запроса (contextvar): число запросов, время в БД и повторы одинаковых statement —
+повтор QUERY_STATS_N_PLUS_ONE_THRESHOLD раз и больше считаем вероятным N+1
+(ленивые relationship в цикле).
+
+Ответ получает заголовки X-DB-Queries, X-DB-Time-Ms, X-DB-N-Plus-One;
+агрегаты по маршрутам — GET /internal/db/queries.
+Запросы, сделанные уже при отдаче StreamingResponse, в счётчик не попадают.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.core.config import settings
+from src.core.metrics import LatencyHistogram
+
+# сколько повторяющихся statement держим в отчёте по маршруту
+TOP_STATEMENTS = 20
+STATEMENT_PREVIEW_CHARS = 300
+
+
+class RequestQueryStats:
+    __slots__ = ("count", "time_ms", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.time_ms = 0.0
+        self.statements: Counter[str] = Counter()
+
+    def repeated(self) -> dict[str, int]:
+        threshold = settings.QUERY_STATS_N_PLUS_ONE_THRESHOLD
+        return {sql: n for sql, n in self.statements.items() if n >= threshold}
+
+
+_current: ContextVar[RequestQueryStats | None] = ContextVar("request_query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = conn.info.get("query_stats_started")
+    if started:
+        stats.time_ms += (time.perf_counter() - started.pop()) * 1000
+    stats.count += 1
+    stats.statements[statement] += 1
+
+
+class RouteReport:
+    def __init__(self):
+        self.requests = 0
+        self.queries_total = 0
+        self.queries_max = 0
+        self.n_plus_one_requests = 0
+        self.db_time = LatencyHistogram()
+        self.repeated: Counter[str] = Counter()
+
+
+class QueryReport:
+    """Агрегаты по шаблону маршрута в этом процессе."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: dict[str, RouteReport] = {}
+
+    def observe(self, route: str, stats: RequestQueryStats) -> None:
+        repeated = stats.repeated()
+        with self._lock:
+            r = self._routes.setdefault(route, RouteReport())
+            r.requests += 1
+            r.queries_total += stats.count
+            r.queries_max = max(r.queries_max, stats.count)
+            if repeated:
+                r.n_plus_one_requests += 1
+                r.repeated.update({sql[:STATEMENT_PREVIEW_CHARS]: n for sql, n in repeated.items()})
+                if len(r.repeated) > TOP_STATEMENTS * 2:
+                    r.repeated = Counter(dict(r.repeated.most_common(TOP_STATEMENTS)))
+        r.db_time.observe(stats.time_ms)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            routes = list(self._routes.items())
+        return {
+            route: {
+                "requests": r.requests,
+                "queries_avg": round(r.queries_total / r.requests, 2) if r.requests else 0.0,
+                "queries_max": r.queries_max,
+                "n_plus_one_requests": r.n_plus_one_requests,
+                "db_time": r.db_time.snapshot(),
+                "repeated_statements": [
+                    {"statement": sql, "executions": n} for sql, n in r.repeated.most_common(TOP_STATEMENTS)
+                ],
+            }
+            for route, r in routes
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+query_report = QueryReport()
+
+
+def install_query_stats() -> None:
+    """Подписывается на события всех Engine (включая async и реплики)."""
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+async def query_stats_middleware(request: Request, call_next):
+    stats = RequestQueryStats()
+    token = _current.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+
+    # шаблон пути, а не сам путь; без маршрута (404 от сканеров и т.п.) — одна метка на всех,
+    # иначе отчёт растёт без предела
+    route = request.scope.get("route")
+    query_report.observe(f"{request.method} {route.path}" if route is not None else "<unmatched>", stats)
+
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["X-DB-Time-Ms"] = f"{stats.time_ms:.1f}"
+    response.headers["X-DB-N-Plus-One"] = str(sum(stats.repeated().values()))
+    return response
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import itertools
+import time
+
+from fastapi import Request
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.db.async_session import async_url
+from src.db.pool import pool_kwargs, install_idle_ping
+
+# cookie с моментом (unix time), до которого чтения этого клиента идут на primary:
+# in-process кэш ниже не виден другим воркерам, cookie — виден
+RYW_COOKIE = "ryw_until"
+
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+REPLICA_URLS = [u.strip() for u in settings.DATABASE_REPLICA_URLS.split(",") if u.strip()]
+
+
+def _connect_args(url: str) -> dict:
+    return {"sslmode": settings.DB_SSLMODE} if url.startswith("postgresql") else {}
+
+
+def _make_engine(url: str):
+    engine = create_engine(url, echo=False, future=True, connect_args=_connect_args(url), **pool_kwargs(url))
+    install_idle_ping(engine)
+    return engine
+
+
+def _make_async_engine(url: str):
+    engine = create_async_engine(
+        async_url(url), echo=False, connect_args=_connect_args(url), **pool_kwargs(url, is_async=True)
+    )
+    install_idle_ping(engine.sync_engine)
+    return engine
+
+
+replica_engines = [_make_engine(url) for url in REPLICA_URLS]
+async_replica_engines = [_make_async_engine(url) for url in REPLICA_URLS]
+
+ReplicaSessions = [sessionmaker(bind=e, autocommit=False, autoflush=False, future=True) for e in replica_engines]
+AsyncReplicaSessions = [
+    async_sessionmaker(bind=e, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    for e in async_replica_engines
+]
+
+# round-robin: next() у itertools.count атомарен под GIL
+_next_replica = itertools.count()
+
+# кто недавно писал (user id) — его чтения идут на primary, пока реплика догоняет
+_recent_writers: TTLCache[bool] = TTLCache(maxsize=100_000, ttl=settings.READ_YOUR_WRITES_SECONDS)
+
+
+def replicas_enabled() -> bool:
+    return bool(REPLICA_URLS)
+
+
+def mark_writer(user_id: int) -> None:
+    _recent_writers.set(user_id, True)
+
+
+def is_sticky(request: Request, user_id: int) -> bool:
+    if _recent_writers.get(user_id):
+        return True
+    try:
+        return float(request.cookies.get(RYW_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pick_replica() -> int:
+    return next(_next_replica) % len(REPLICA_URLS)
+
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """
+    После успешного запроса на запись (не GET/HEAD/OPTIONS) от авторизованного пользователя
+    его чтения READ_YOUR_WRITES_SECONDS идут на primary.
+    principal_id кладёт в request.state get_current_user.
+    """
+    response = await call_next(request)
+    user_id = getattr(request.state, "principal_id", None)
+    if request.method not in _SAFE_METHODS and user_id is not None and response.status_code < 400:
+        window = settings.READ_YOUR_WRITES_SECONDS
+        mark_writer(user_id)
+        response.set_cookie(
+            RYW_COOKIE, str(int(time.time()) + window), max_age=window, httponly=True, samesite="lax"
+        )
+    return response
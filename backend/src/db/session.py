@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from src.core.config import settings
+from src.db.pool import pool_kwargs, install_idle_ping
 
 connect_args = {}
 
@@ -14,12 +15,29 @@ engine = create_engine(
     settings.DATABASE_URL,
     echo=False,
     future=True,
-    pool_pre_ping=True,
     connect_args=connect_args,
+    **pool_kwargs(settings.DATABASE_URL),
 )
+install_idle_ping(engine)
+
+if engine.dialect.name == "sqlite":
+    # pysqlite сам решает, когда слать BEGIN, и ломает SAVEPOINT (apply_batch):
+    # отключаем его логику и открываем транзакцию явно (рецепт из документации SQLAlchemy)
+    @event.listens_for(engine, "connect")
+    def _sqlite_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _sqlite_begin(conn):
+        conn.exec_driver_sql("BEGIN")
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 
+# журнал изменений для /sync/changes
+from src.db.change_tracking import track_changes  # noqa: E402
+
+track_changes(SessionLocal)
+
 def get_db():
     db = SessionLocal()
     try:
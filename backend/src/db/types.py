@@ -0,0 +1,5 @@
+from sqlalchemy import JSON
+from sqlalchemy.dialects.postgresql import JSONB
+
+# JSONB на PostgreSQL; на SQLite (dev, бенч) JSONB не компилируется — там обычный JSON
+JSONType = JSONB().with_variant(JSON(), "sqlite")
@@ -4,6 +4,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from src.core.config import settings
 from src.api.router import api_router
 from src.db.init_db import init_db
+from src.db.session import SessionLocal
+from src.db.async_session import async_engine
+from src.db.replicas import replicas_enabled, read_your_writes_middleware, async_replica_engines
+from src.db.query_stats import install_query_stats, query_stats_middleware
+from src.services.sync_jobs import fail_orphaned_jobs
 
 app = FastAPI(title=settings.APP_NAME)
 
@@ -13,11 +18,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-DB-Queries", "X-DB-Time-Ms", "X-DB-N-Plus-One"],
 )
 
+if replicas_enabled():
+    app.middleware("http")(read_your_writes_middleware)
+
+if settings.QUERY_STATS_ENABLED:
+    install_query_stats()
+    app.middleware("http")(query_stats_middleware)
+
 @app.on_event("startup")
 def on_startup():
     init_db()
+    # job умерших процессов (в т.ч. прошлого запуска) не доживут до конца: их ops были в памяти
+    with SessionLocal() as db:
+        fail_orphaned_jobs(db)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await async_engine.dispose()
+    for e in async_replica_engines:
+        await e.dispose()
 
 @app.get("/health")
 def health():
@@ -0,0 +1,49 @@
+"""
+Служебные команды: python -m src.manage <command>
+"""
+import argparse
+import logging
+
+from src.db.session import engine, SessionLocal
+from src.services.oplog_retention import ensure_partitions, archive_operation_log
+from src.services.token_service import purge_expired_refresh_tokens
+from src.services.checklist_service import rebuild_checklist_counters
+
+
+def oplog_maintenance() -> None:
+    # партиции вперёд + архивация старых; удобно гонять раз в сутки по cron
+    ensure_partitions(engine)
+    with SessionLocal() as db:
+        archived = archive_operation_log(engine, db)
+    print(f"operation_log: archived {archived}")
+
+
+def purge_refresh_tokens() -> None:
+    with SessionLocal() as db:
+        deleted = purge_expired_refresh_tokens(db)
+    print(f"refresh_tokens: purged {deleted}")
+
+
+def rebuild_counters() -> None:
+    with SessionLocal() as db:
+        fixed = rebuild_checklist_counters(db)
+    print(f"patient_checklists: rebuilt counters for {fixed}")
+
+
+COMMANDS = {
+    "oplog-maintenance": oplog_maintenance,
+    "purge-refresh-tokens": purge_refresh_tokens,
+    "rebuild-checklist-counters": rebuild_counters,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.manage")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    COMMANDS[args.command]()
+
+
+if __name__ == "__main__":
+    main()
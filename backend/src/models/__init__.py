@@ -5,7 +5,11 @@ from .checklist import ChecklistTemplate, ChecklistItemTemplate
 from .patient_checklist import PatientChecklist, PatientChecklistItem
 from .file_asset import FileAsset
 from .review import Review, ReviewDecision, Comment
-from .oplog import OperationLog
+from .oplog import OperationLog, OperationLogId
+from .sync_change import SyncChange
+from .sync_job import SyncJob
+from .refresh_token import RefreshToken
+from .cache_version import CacheVersion
 
 __all__ = [
     "Organization",
@@ -15,5 +19,9 @@ __all__ = [
     "PatientChecklist", "PatientChecklistItem",
     "FileAsset",
     "Review", "ReviewDecision", "Comment",
-    "OperationLog",
+    "OperationLog", "OperationLogId",
+    "SyncChange",
+    "SyncJob",
+    "RefreshToken",
+    "CacheVersion",
 ]
\ No newline at end of file
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+
+from src.db.base import Base
+
+
+class CacheVersion(Base):
+    """
+    Счётчик версии для in-process кэшей: запись увеличивает version,
+    воркеры периодически сверяют его и сбрасывают свой кэш.
+    """
+    __tablename__ = "cache_versions"
+
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
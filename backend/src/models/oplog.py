@@ -1,20 +1,29 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, PrimaryKeyConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
-try:
-    from sqlalchemy.dialects.postgresql import JSONB as JSONType
-except Exception:
-    from sqlalchemy import JSON as JSONType  # type: ignore
-
+from src.core.config import settings
 from src.db.base import Base
+from src.db.types import JSONType
+
+# SQLite автоинкрементит только одиночный INTEGER PRIMARY KEY — там PK без created_at
+_OPLOG_PK = ("id",) if settings.DATABASE_URL.startswith("sqlite") else ("id", "created_at")
 
 
 class OperationLog(Base):
+    """
+    Журнал применённых sync-операций. Схема совпадает с партиционированной таблицей
+    (_PARTITIONED_DDL в src/services/oplog_retention.py): PK и UNIQUE включают created_at —
+    ключ партиционирования, поэтому op_id уникален только вместе с created_at.
+    Уникальность op_id по всем партициям — в OperationLogId.
+    """
     __tablename__ = "operation_log"
-    __table_args__ = (UniqueConstraint("op_id", name="uq_operation_log_op_id"),)
+    __table_args__ = (
+        PrimaryKeyConstraint(*_OPLOG_PK),
+        UniqueConstraint("op_id", "created_at", name="uq_operation_log_op_id"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), autoincrement=True, index=True)
 
     op_id = Column(String(64), nullable=False, index=True)
     action = Column(String(64), nullable=False, index=True)
@@ -24,4 +33,19 @@ class OperationLog(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
-    user = relationship("User", back_populates="ops")
\ No newline at end of file
+    user = relationship("User", back_populates="ops")
+
+
+class OperationLogId(Base):
+    """
+    op_id операций из окна идемпотентности — обычная (не партиционированная) таблица.
+    У партиционированного operation_log UNIQUE только вместе с created_at, поэтому два
+    параллельных повтора одной операции оба прошли бы проверку; здесь второй ждёт
+    commit первого и получает unique violation -> "duplicate".
+    Чистится вместе с архивацией (src/services/oplog_retention.py).
+    """
+    __tablename__ = "operation_log_ids"
+    __table_args__ = (PrimaryKeyConstraint("op_id", name="pk_operation_log_ids_op_id"),)
+
+    op_id = Column(String(64), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
@@ -1,14 +1,10 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, Enum, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from enum import Enum as En
 
-try:
-    from sqlalchemy.dialects.postgresql import JSONB as JSONType
-except Exception:
-    from sqlalchemy import JSON as JSONType  # type: ignore
-
 from src.db.base import Base
+from src.db.types import JSONType
 
 class PatientStatus(str, En):
     NEW = "NEW"
@@ -22,6 +18,12 @@ class PatientStatus(str, En):
 
 class Patient(Base):
     __tablename__ = "patients"
+    # keyset-пагинация списка: фильтр по org (+status), порядок (updated_at, id)
+    __table_args__ = (
+        Index("ix_patients_org_status_updated", "organization_id", "status", "updated_at", "id"),
+        Index("ix_patients_org_updated", "organization_id", "updated_at", "id"),
+        Index("ix_patients_updated", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -45,9 +47,14 @@ class Patient(Base):
     fhir_resource_json = Column(JSONType, nullable=True)
     external_system_id = Column(String(128), nullable=True)
 
+    # optimistic locking: UPDATE ... WHERE id = ? AND version = ?; устаревшая запись -> StaleDataError
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
+    __mapper_args__ = {"version_id_col": version}
+
     organization = relationship("Organization", back_populates="patients")
     checklists = relationship("PatientChecklist", back_populates="patient", cascade="all,delete", passive_deletes=True)
     files = relationship("FileAsset", back_populates="patient", cascade="all,delete", passive_deletes=True)
@@ -15,9 +15,19 @@ class PatientChecklist(Base):
 
     status = Column(String(32), default="IN_PROGRESS", nullable=False, index=True)
 
+    # денормализованный прогресс: меняется вместе с пунктами в той же транзакции
+    # (ремонт: python -m src.manage rebuild-checklist-counters)
+    done_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # optimistic locking (см. Patient.version)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
+    __mapper_args__ = {"version_id_col": version}
+
     patient = relationship("Patient", back_populates="checklists")
     template = relationship("ChecklistTemplate", back_populates="patient_checklists")
     items = relationship("PatientChecklistItem", back_populates="patient_checklist", cascade="all,delete", passive_deletes=True)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+
+from src.db.base import Base
+
+
+class RefreshToken(Base):
+    """
+    Ротируемый refresh token. Сам токен не храним — только sha256 (64 hex).
+    family_id связывает цепочку ротаций одного логина: повторное использование
+    уже отозванного токена отзывает всю цепочку.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    token_hash = Column(String(64), nullable=False, unique=True)
+    family_id = Column(String(32), nullable=False, index=True)
+
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Index, text
+from sqlalchemy.sql import func
+
+from src.db.base import Base
+
+
+class SyncChange(Base):
+    """
+    Журнал изменений для pull-синхронизации (/sync/changes).
+    Курсор клиента — seq на PostgreSQL (порядок commit, см. src/services/change_feed.py)
+    и id на SQLite (там писатели сериализованы, и порядок id совпадает с порядком commit).
+    FK намеренно нет: запись об удалении должна пережить саму сущность.
+    """
+    __tablename__ = "sync_changes"
+    __table_args__ = (
+        Index("ix_sync_changes_org_cursor", "organization_id", "id"),
+        Index("ix_sync_changes_org_seq", "organization_id", "seq"),
+        Index("ix_sync_changes_seq", "seq"),
+        # ещё не опубликованные строки (seq IS NULL) — маленький хвост журнала
+        Index(
+            "ix_sync_changes_unpublished", "id",
+            postgresql_where=text("seq IS NULL"), sqlite_where=text("seq IS NULL"),
+        ),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # номер публикации: присваивается уже закоммиченным строкам, по возрастанию
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=True)
+
+    entity = Column(String(32), nullable=False)  # patient | checklist | checklist_item | blood_labs | file
+    entity_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, default=False, nullable=False)
+
+    patient_id = Column(Integer, nullable=True)
+    organization_id = Column(Integer, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+
+from src.db.base import Base
+from src.db.types import JSONType
+
+
+class SyncJob(Base):
+    """
+    Фоновая обработка большой пачки /sync/batch: клиент получает 202 + id и опрашивает статус.
+    """
+    __tablename__ = "sync_jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+
+    status = Column(String(16), default="queued", nullable=False, index=True)  # queued | running | done | failed
+    # процесс, у которого в памяти ops этой job, и его последняя отметка «жив»
+    worker_id = Column(String(64), nullable=True, index=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    total_ops = Column(Integer, nullable=False)
+    result = Column(JSONType, nullable=True)  # BatchOut после завершения
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -3,6 +3,10 @@ from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 from src.schemas.common import ORMBase
+from src.schemas.patient import PatientOut
+from src.schemas.patient_checklist import PatientChecklistItemOut
+from src.schemas.blood_labs import BloodLabOut
+from src.schemas.file_asset import FileAssetOut
 
 class OpIn(BaseModel):
     op_id: str = Field(min_length=1, max_length=64)
@@ -15,7 +19,7 @@ class BatchIn(BaseModel):
 
 class OpResult(BaseModel):
     op_id: str
-    status: str  # applied | duplicate | error
+    status: str  # applied | duplicate | error | conflict
     message: Optional[str] = None
 
 class BatchOut(BaseModel):
@@ -28,4 +32,37 @@ class OperationLogOut(ORMBase):
     action: str
     payload: Dict[str, Any]
     user_id: Optional[int] = None
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+class ChecklistChangeOut(ORMBase):
+    id: int
+    patient_id: int
+    template_id: Optional[int] = None
+    status: str
+    done_count: int
+    total_count: int
+    version: int
+    updated_at: datetime
+
+class DeletedRef(BaseModel):
+    entity: str
+    id: int
+
+class ChangesOut(BaseModel):
+    cursor: int  # передать как since в следующий запрос
+    has_more: bool
+    patients: List[PatientOut] = []
+    checklists: List[ChecklistChangeOut] = []
+    checklist_items: List[PatientChecklistItemOut] = []
+    blood_labs: List[BloodLabOut] = []
+    files: List[FileAssetOut] = []
+    deleted: List[DeletedRef] = []
+
+class SyncJobOut(ORMBase):
+    id: str
+    status: str  # queued | running | done | failed
+    total_ops: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[BatchOut] = None
\ No newline at end of file
@@ -4,7 +4,7 @@ from datetime import date, datetime
 
 from src.schemas.common import ORMBase
 from src.models.patient import PatientStatus
-from src.core.validators import validate_snils
+from src.core.validators import validate_snils, normalize_polis
 
 class PatientCreate(BaseModel):
     organization_id: Optional[int] = None
@@ -36,6 +36,13 @@ class PatientCreate(BaseModel):
             return None
         return validate_snils(v)
 
+    @field_validator("polis")
+    @classmethod
+    def _polis(cls, v):
+        if not v:
+            return None
+        return normalize_polis(v) or None
+
 class PatientUpdate(BaseModel):
     organization_id: Optional[int] = None
 
@@ -66,6 +73,13 @@ class PatientUpdate(BaseModel):
             return None
         return validate_snils(v)
 
+    @field_validator("polis")
+    @classmethod
+    def _polis(cls, v):
+        if not v:
+            return None
+        return normalize_polis(v) or None
+
 class PatientOut(ORMBase):
     id: int
     organization_id: Optional[int] = None
@@ -79,6 +93,7 @@ class PatientOut(ORMBase):
     passport: Optional[str] = None
 
     status: PatientStatus
+    version: int
 
     diagnosis_text: Optional[str] = None
     operation_type: Optional[str] = None
@@ -21,6 +21,9 @@ class PatientChecklistOut(ORMBase):
     patient_id: int
     template_id: Optional[int] = None
     status: str
+    version: int
+    done_count: int
+    total_count: int
     created_at: datetime
     updated_at: datetime
     items: List["PatientChecklistItemOut"] = []
@@ -41,6 +44,14 @@ class PatientChecklistItemUpdate(BaseModel):
     done_at: Optional[datetime] = None
 
 
+class PatientChecklistItemBulkPatch(PatientChecklistItemUpdate):
+    id: int
+
+
+class PatientChecklistItemsBulkUpdate(BaseModel):
+    items: List[PatientChecklistItemBulkPatch] = Field(min_length=1, max_length=200)
+
+
 class PatientChecklistItemOut(ORMBase):
     id: int
     patient_checklist_id: int
@@ -60,4 +71,37 @@ class PatientChecklistProgressOut(BaseModel):
     percent: int
 
 
+class ChecklistViewItemOut(BaseModel):
+    """Пункт чек-листа вместе с метаданными шаблона и числом прикреплённых файлов."""
+    id: int
+    item_template_id: int
+
+    title: str
+    description: Optional[str] = None
+    order_index: int
+    requires_file: bool
+    requires_value: bool
+    value_hint: Optional[str] = None
+
+    done: bool
+    done_at: Optional[datetime] = None
+    value_text: Optional[str] = None
+    note: Optional[str] = None
+    files_count: int = 0
+
+    updated_at: datetime
+
+
+class PatientChecklistViewOut(BaseModel):
+    id: int
+    patient_id: int
+    template_id: Optional[int] = None
+    status: str
+    version: int
+    created_at: datetime
+    updated_at: datetime
+    progress: PatientChecklistProgressOut
+    items: List[ChecklistViewItemOut] = []
+
+
 PatientChecklistOut.model_rebuild()
\ No newline at end of file
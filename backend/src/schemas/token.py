@@ -3,6 +3,10 @@ from pydantic import BaseModel
 class TokenOut(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: str | None = None
+
+class RefreshIn(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: str
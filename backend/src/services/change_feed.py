@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.orm import Session
+
+from src.models import SyncChange, User
+from src.db.change_tracking import TRACKED_ENTITIES
+from src.schemas.oplog import ChangesOut, ChecklistChangeOut, DeletedRef
+from src.schemas.patient import PatientOut
+from src.schemas.patient_checklist import PatientChecklistItemOut
+from src.schemas.blood_labs import BloodLabOut
+from src.schemas.file_asset import FileAssetOut
+
+MAX_CHANGES_LIMIT = 1000
+# сколько строк публикуем за один вызов (остальные — в следующем, has_more=True)
+PUBLISH_CHUNK_SIZE = 5000
+# pg_advisory_xact_lock: публикации идут строго по одной
+PUBLISH_LOCK_KEY = 0x53594E43  # "SYNC"
+
+# entity -> (поле ChangesOut, схема)
+_OUT_FIELDS = {
+    "patient": ("patients", PatientOut),
+    "checklist": ("checklists", ChecklistChangeOut),
+    "checklist_item": ("checklist_items", PatientChecklistItemOut),
+    "blood_labs": ("blood_labs", BloodLabOut),
+    "file": ("files", FileAssetOut),
+}
+_MODELS = {name: model for model, name in TRACKED_ENTITIES.items()}
+
+
+def _cursor_column(db: Session):
+    return SyncChange.seq if db.get_bind().dialect.name == "postgresql" else SyncChange.id
+
+
+def publish_changes(db: Session) -> bool:
+    """
+    PostgreSQL: id из sequence выдаётся до commit, и строка с меньшим id может стать
+    видимой позже строки с большим — курсор по id её бы навсегда пропустил.
+    Поэтому клиентский курсор — seq: его получают только уже закоммиченные строки,
+    по одной публикации за раз (advisory-лок), так что всё, что станет видимым позже,
+    получит seq больше любого уже выданного. Возвращает True, если опубликовано не всё.
+    На SQLite не нужно: писатели сериализованы, порядок id = порядок commit.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    if db.scalar(select(SyncChange.id).where(SyncChange.seq.is_(None)).limit(1)) is None:
+        return False
+
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PUBLISH_LOCK_KEY})
+    ids = db.scalars(
+        select(SyncChange.id)
+        .where(SyncChange.seq.is_(None))
+        .order_by(SyncChange.id.asc())
+        .limit(PUBLISH_CHUNK_SIZE)
+    ).all()
+    if ids:
+        last = db.scalar(select(func.max(SyncChange.seq))) or 0
+        db.execute(update(SyncChange), [{"id": i, "seq": last + n} for n, i in enumerate(ids, 1)])
+    db.commit()
+    return len(ids) == PUBLISH_CHUNK_SIZE
+
+
+def get_changes(db: Session, user: User, since: int = 0, limit: int = 500) -> ChangesOut:
+    """
+    Pull-синхронизация: всё, что изменилось в организации пользователя после курсора since.
+    Читаем только хвост sync_changes (курсор > since), поэтому цена запроса зависит
+    от объёма изменений, а не от размера организации. Курсор не обгоняет незакоммиченные
+    изменения (см. publish_changes), так что перекрытие при повторных запросах не нужно.
+    """
+    limit = max(1, min(limit, MAX_CHANGES_LIMIT))
+    unpublished = publish_changes(db)
+    cursor_col = _cursor_column(db)
+
+    q = db.query(SyncChange).filter(cursor_col > since)
+    if user.role.value != "admin":
+        if user.organization_id is None:
+            return ChangesOut(cursor=since, has_more=False)
+        q = q.filter(SyncChange.organization_id == user.organization_id)
+
+    rows = q.order_by(cursor_col.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit or unpublished
+    rows = rows[:limit]
+    cursor = getattr(rows[-1], cursor_col.key) if rows else since
+
+    # одна сущность могла меняться много раз — нужна только последняя запись
+    latest: dict[tuple[str, int], bool] = {}
+    for r in rows:
+        latest[(r.entity, r.entity_id)] = r.deleted
+
+    out = ChangesOut(cursor=cursor, has_more=has_more)
+    ids_by_entity: dict[str, list[int]] = {}
+    for (entity, entity_id), deleted in latest.items():
+        if deleted:
+            out.deleted.append(DeletedRef(entity=entity, id=entity_id))
+        else:
+            ids_by_entity.setdefault(entity, []).append(entity_id)
+
+    for entity, ids in ids_by_entity.items():
+        model = _MODELS[entity]
+        field, schema = _OUT_FIELDS[entity]
+        objs = db.query(model).filter(model.id.in_(ids)).order_by(model.id.asc()).all()
+        setattr(out, field, [schema.model_validate(o) for o in objs])
+
+    return out
\ No newline at end of file
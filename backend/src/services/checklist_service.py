@@ -4,24 +4,25 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, inspect, or_, select, update
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from src.crud.checklists import (
-    template_crud,
-    template_item_crud,
-    patient_checklist_crud,
-    patient_checklist_item_crud,
-)
+from src.crud.base import commit_or_conflict
+from src.db.change_tracking import record_changes
+from src.crud.checklists import patient_checklist_item_crud
+from src.services.template_cache import template_cache, ItemTemplateSnapshot
 from src.models.patient import Patient, PatientStatus
 from src.models.patient_checklist import PatientChecklist, PatientChecklistItem
 from src.schemas.patient_checklist import (
-    PatientChecklistCreate,
-    PatientChecklistItemCreate,
     PatientChecklistItemUpdate,
+    PatientChecklistItemBulkPatch,
+    PatientChecklistViewOut,
+    ChecklistViewItemOut,
+    PatientChecklistProgressOut,
 )
-from src.crud.checklists import patient_checklist_item_crud
-from src.models.checklist import ChecklistItemTemplate
 from src.models.file_asset import FileAsset
+from src.models.blood_labs import BloodLabPanel
 
 
 def _utcnow() -> datetime:
@@ -38,8 +39,9 @@ def generate_checklist_for_patient(
     - если template_id передан -> используем его
     - иначе -> ищем активный шаблон по patient.operation_type
     """
+    # шаблон и его пункты — из кэша (src.services.template_cache), без запросов в горячем пути
     if template_id is not None:
-        template = template_crud.get(db, template_id)
+        template = template_cache.get_template(db, template_id)
         if not template:
             raise HTTPException(status_code=404, detail="Checklist template not found")
         if not template.is_active:
@@ -47,48 +49,65 @@ def generate_checklist_for_patient(
     else:
         if not patient.operation_type:
             raise HTTPException(status_code=400, detail="Patient.operation_type is required to generate checklist")
-        template = template_crud.get_active_for_operation(db, patient.operation_type)
+        template = template_cache.get_active_for_operation(db, patient.operation_type)
         if not template:
             raise HTTPException(status_code=404, detail="No active checklist template for this operation_type")
 
-    template_items = template_item_crud.list_for_template(db, template.id)
+    template_items = template.items
     if not template_items:
         raise HTTPException(status_code=400, detail="Template has no items")
 
-    # 1) создаём шапку чеклиста
-    checklist = patient_checklist_crud.create(
-        db,
-        PatientChecklistCreate(
-            patient_id=patient.id,
-            template_id=template.id,
-            status="IN_PROGRESS",
-        ),
+    # 1) шапка + items одним flush: items уходят одним batched INSERT (insertmanyvalues),
+    # а не create()+commit+refresh на каждый пункт
+    checklist = PatientChecklist(
+        patient_id=patient.id,
+        template_id=template.id,
+        status="IN_PROGRESS",
+        done_count=0,
+        total_count=len(template_items),
+        items=[
+            PatientChecklistItem(item_template_id=it.id, done=False, value_text=None, note=None)
+            for it in template_items
+        ],
     )
+    db.add(checklist)
 
-    # 2) создаём items по шаблону
-    for it in template_items:
-        patient_checklist_item_crud.create(
-            db,
-            PatientChecklistItemCreate(
-                patient_checklist_id=checklist.id,
-                item_template_id=it.id,
-                done=False,
-                value_text=None,
-                note=None,
-            ),
-        )
-
-    # 3) статус пациента: если только что создали план — логично перевести из NEW -> IN_PREPARATION
+    # 2) статус пациента: если только что создали план — логично перевести из NEW -> IN_PREPARATION
     if patient.status == PatientStatus.NEW:
         patient.status = PatientStatus.IN_PREPARATION
         db.add(patient)
-        db.commit()
-        db.refresh(patient)
 
-    # подгружаем items (чтобы сразу вернуть с items)
-    db.refresh(checklist)
-    checklist.items  # trigger lazy-load при необходимости
-    return checklist
+    # 3) одна транзакция и один commit на всю генерацию
+    commit_or_conflict(db)
+
+    # возвращаем сразу с items: 2 запроса (шапка + selectin items);
+    # id берём из identity — обращение к checklist.id после commit дало бы лишний SELECT
+    checklist_id = inspect(checklist).identity[0]
+    return (
+        db.query(PatientChecklist)
+        .options(selectinload(PatientChecklist.items))
+        .filter(PatientChecklist.id == checklist_id)
+        .one()
+    )
+
+
+def _shift_done_count(db: Session, checklist: PatientChecklist, delta: int) -> None:
+    """
+    Атомарно сдвигает checklist.done_count: UPDATE ... SET done_count = done_count + :delta RETURNING.
+    Без version_id: параллельные отметки разных пунктов не конфликтуют, а ждут друг друга
+    на блокировке строки до commit — счётчик всегда согласован с пунктами.
+    """
+    if not delta:
+        return
+    done = db.execute(
+        update(PatientChecklist)
+        .where(PatientChecklist.id == checklist.id)
+        .values(done_count=PatientChecklist.done_count + delta)
+        .returning(PatientChecklist.done_count)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    set_committed_value(checklist, "done_count", done)
+    record_changes(db, PatientChecklist, [checklist.id])
 
 
 def _recompute_patient_status_from_checklist(db: Session, patient: Patient, checklist: PatientChecklist) -> None:
@@ -97,9 +116,9 @@ def _recompute_patient_status_from_checklist(db: Session, patient: Patient, chec
     - если все пункты done -> READY_FOR_REVIEW + checklist COMPLETED
     - иначе (если пациент был NEW) -> IN_PREPARATION
     Важно: статусы "после хирурга" не перетираем.
+    O(1) по счётчикам чек-листа; commit — на вызывающем.
     """
-    items = patient_checklist_item_crud.list_for_checklist(db, checklist.id)
-    all_done = all(i.done for i in items) if items else False
+    all_done = checklist.total_count > 0 and checklist.done_count >= checklist.total_count
 
     # если пациент уже в стадиях после проверки хирурга/операции — не трогаем
     if patient.status in {
@@ -112,7 +131,6 @@ def _recompute_patient_status_from_checklist(db: Session, patient: Patient, chec
         if all_done and checklist.status != "COMPLETED":
             checklist.status = "COMPLETED"
             db.add(checklist)
-            db.commit()
         return
 
     if all_done:
@@ -126,7 +144,101 @@ def _recompute_patient_status_from_checklist(db: Session, patient: Patient, chec
 
     db.add(patient)
     db.add(checklist)
-    db.commit()
+
+
+def _prepare_patch(patch: PatientChecklistItemUpdate) -> dict:
+    data = patch.model_dump(exclude_unset=True, exclude={"id"})
+    if data.get("done") is None:
+        data.pop("done", None)
+    # done_at при смене done ставит _apply_done; снятие отметки всегда обнуляет его
+    if data.get("done") is False:
+        data.pop("done_at", None)
+    return data
+
+
+def _latest_blood_panel(db: Session, patient_id: int) -> Optional[BloodLabPanel]:
+    return (
+        db.query(BloodLabPanel)
+        .filter(BloodLabPanel.patient_id == patient_id)
+        .order_by(BloodLabPanel.id.desc())
+        .first()
+    )
+
+
+def _done_requirement_error(
+    tpl: ItemTemplateSnapshot,
+    item: PatientChecklistItem,
+    data: dict,
+    has_file: bool,
+    panel: Optional[BloodLabPanel],
+) -> Optional[str]:
+    """
+    Требования для done=True. Файлы и анализы вызывающий загружает сам
+    (по одному пункту или пачкой), здесь только проверка.
+    """
+    if tpl.requires_value and not (data.get("value_text") or item.value_text):
+        return "This item requires value_text before marking done"
+
+    # хотя бы один файл, привязанный к этому пункту
+    if tpl.requires_file and not has_file:
+        return "This item requires file upload before marking done"
+
+    if tpl.kind == "BLOOD_LABS":
+        if not panel:
+            return "Blood labs are required before marking done"
+
+        # минимальная мед-валидация (чтобы не вводили мусор)
+        if panel.glucose_unit == "mmol/L" and not (0.5 <= panel.glucose_value <= 40):
+            return "Glucose value looks out of range"
+        if panel.hemoglobin_unit == "g/L" and not (30 <= panel.hemoglobin_value <= 250):
+            return "Hemoglobin value looks out of range"
+    return None
+
+
+def _apply_done(db: Session, patched: list[tuple[PatientChecklistItem, dict]]) -> tuple[int, set[int]]:
+    """
+    Меняет done условным UPDATE ... WHERE done IS DISTINCT FROM :v RETURNING id (по запросу
+    на каждое значение). Сдвиг done_count считается по реально переключённым строкам, а не
+    по прочитанному раньше item.done: две параллельные отметки одного пункта дают +1, а не +2
+    (вторая ждёт блокировку строки и после commit первой уже не проходит по WHERE).
+    Возвращает (сдвиг done_count, id переключённых пунктов).
+    """
+    delta = 0
+    flipped: set[int] = set()
+    for value in (True, False):
+        items = [item for item, data in patched if data.get("done") is value]
+        if not items:
+            continue
+        done_at = _utcnow() if value else None
+        changed = set(
+            db.execute(
+                update(PatientChecklistItem)
+                .where(
+                    PatientChecklistItem.id.in_([i.id for i in items]),
+                    PatientChecklistItem.done.is_distinct_from(value),
+                )
+                .values(done=value, done_at=done_at)
+                .returning(PatientChecklistItem.id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+        for item in items:
+            if item.id in changed:
+                set_committed_value(item, "done", value)
+                set_committed_value(item, "done_at", done_at)
+        delta += len(changed) if value else -len(changed)
+        flipped |= changed
+    record_changes(db, PatientChecklistItem, flipped)
+    return delta, flipped
+
+
+def _apply_fields(db: Session, item: PatientChecklistItem, data: dict, flipped: bool) -> None:
+    # остальные поля патча — через ORM; done уже записан _apply_done
+    for k, v in data.items():
+        if k == "done" or (k == "done_at" and flipped):
+            continue
+        setattr(item, k, v)
+    db.add(item)
 
 
 def update_patient_checklist_item(
@@ -137,70 +249,192 @@ def update_patient_checklist_item(
     patch: PatientChecklistItemUpdate,
 ) -> PatientChecklistItem:
     """
-    Обновляем один пункт чек-листа и пересчитываем статус пациента.
+    Обновляем один пункт чек-листа, счётчик done_count и статус пациента — одним commit.
     """
     item = patient_checklist_item_crud.get_for_checklist(db, checklist.id, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Checklist item not found")
 
-    # done_at управляем аккуратно:
-    data = patch.model_dump(exclude_unset=True)
-
-    if "done" in data:
-        if data["done"] is True and not item.done:
-            data["done_at"] = _utcnow()
-        if data["done"] is False:
-            data["done_at"] = None
+    data = _prepare_patch(patch)
 
-    tpl = db.query(ChecklistItemTemplate).filter(ChecklistItemTemplate.id == item.item_template_id).one_or_none()
+    tpl = template_cache.get_item_template(db, item.item_template_id)
     if not tpl:
         raise HTTPException(status_code=500, detail="Checklist item template missing")
 
-    data = patch.model_dump(exclude_unset=True)
-
     # Если пытаемся поставить done=True — проверяем требования
     if data.get("done") is True:
-        if tpl.requires_value and not (data.get("value_text") or item.value_text):
-            raise HTTPException(status_code=400, detail="This item requires value_text before marking done")
-
-        if tpl.requires_file:
-            # ищем хотя бы один файл, привязанный к этому пункту
-            has_file = (
-                db.query(FileAsset)
-                .filter(FileAsset.checklist_item_id == item.id)
-                .first()
-                is not None
-            )
-            if not has_file:
-                raise HTTPException(status_code=400, detail="This item requires file upload before marking done")
-            
-        if getattr(tpl, "kind", None) == "BLOOD_LABS":
-            panel = (
-                db.query(BloodLabPanel)
-                .filter(BloodLabPanel.patient_id == item.patient_id)
-                .order_by(BloodLabPanel.id.desc())
-                .first()
-            )
-            if not panel:
-                raise HTTPException(status_code=400, detail="Blood labs are required before marking done")
-
-            # минимальная мед-валидация (чтобы не вводили мусор)
-            if panel.glucose_unit == "mmol/L" and not (0.5 <= panel.glucose_value <= 40):
-                raise HTTPException(status_code=400, detail="Glucose value looks out of range")
-            if panel.hemoglobin_unit == "g/L" and not (30 <= panel.hemoglobin_value <= 250):
-                raise HTTPException(status_code=400, detail="Hemoglobin value looks out of range")
+        has_file = tpl.requires_file and (
+            db.query(FileAsset.id).filter(FileAsset.checklist_item_id == item.id).first() is not None
+        )
+        panel = _latest_blood_panel(db, patient.id) if tpl.kind == "BLOOD_LABS" else None
+        error = _done_requirement_error(tpl, item, data, has_file, panel)
+        if error:
+            raise HTTPException(status_code=400, detail=error)
 
-    updated = patient_checklist_item_crud.update(db, item, PatientChecklistItemUpdate(**data))
+    delta, flipped = _apply_done(db, [(item, data)])
+    _apply_fields(db, item, data, item.id in flipped)
+    _shift_done_count(db, checklist, delta)
 
     # пересчитать статус пациента по прогрессу
     _recompute_patient_status_from_checklist(db, patient, checklist)
 
-    return updated
+    # compare-and-swap по version: параллельный переход статуса не перетирается молча
+    commit_or_conflict(db)
+    db.refresh(item)
+    return item
+
+
+def bulk_update_patient_checklist_items(
+    db: Session,
+    patient: Patient,
+    checklist: PatientChecklist,
+    patches: list[PatientChecklistItemBulkPatch],
+) -> list[PatientChecklistItem]:
+    """
+    Пачка патчей пунктов (офлайн-планшет отмечает сразу много): всё или ничего.
+    Один запрос на пункты, один на файлы, один на анализы (шаблоны — из кэша),
+    один сдвиг счётчика, один пересчёт статуса и один commit.
+    Ошибки валидации собираются по всем пунктам сразу -> 400 со списком.
+    """
+    ids = [p.id for p in patches]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Duplicate item id in batch")
+
+    items = {
+        i.id: i
+        for i in db.query(PatientChecklistItem).filter(
+            PatientChecklistItem.patient_checklist_id == checklist.id,
+            PatientChecklistItem.id.in_(ids),
+        )
+    }
+    missing = [i for i in ids if i not in items]
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Checklist items not found", "item_ids": missing})
+
+    prepared: list[tuple[PatientChecklistItem, dict, ItemTemplateSnapshot]] = []
+    for patch in patches:
+        item = items[patch.id]
+        tpl = template_cache.get_item_template(db, item.item_template_id)
+        if not tpl:
+            raise HTTPException(status_code=500, detail="Checklist item template missing")
+        prepared.append((item, _prepare_patch(patch), tpl))
+
+    marking_done = [(item, data, tpl) for item, data, tpl in prepared if data.get("done") is True]
+
+    need_file = [item.id for item, _, tpl in marking_done if tpl.requires_file]
+    with_files: set[int] = set()
+    if need_file:
+        with_files = {
+            row[0]
+            for row in db.query(FileAsset.checklist_item_id)
+            .filter(FileAsset.checklist_item_id.in_(need_file))
+            .distinct()
+        }
+
+    panel = None
+    if any(tpl.kind == "BLOOD_LABS" for _, _, tpl in marking_done):
+        panel = _latest_blood_panel(db, patient.id)
+
+    errors = []
+    for item, data, tpl in marking_done:
+        error = _done_requirement_error(tpl, item, data, item.id in with_files, panel)
+        if error:
+            errors.append({"item_id": item.id, "detail": error})
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    delta, flipped = _apply_done(db, [(item, data) for item, data, _ in prepared])
+    for item, data, _ in prepared:
+        _apply_fields(db, item, data, item.id in flipped)
+    _shift_done_count(db, checklist, delta)
+    _recompute_patient_status_from_checklist(db, patient, checklist)
+    commit_or_conflict(db)
+
+    # после commit атрибуты просрочены: перечитываем все пункты одним запросом
+    refreshed = {
+        i.id: i
+        for i in db.query(PatientChecklistItem).filter(PatientChecklistItem.id.in_(ids)).populate_existing()
+    }
+    return [refreshed[i] for i in ids]
 
 
 def get_checklist_progress(db: Session, checklist: PatientChecklist) -> dict:
-    items = patient_checklist_item_crud.list_for_checklist(db, checklist.id)
-    total = len(items)
-    done = sum(1 for i in items if i.done)
+    total = checklist.total_count
+    done = checklist.done_count
     percent = int(round((done / total) * 100)) if total > 0 else 0
-    return {"done": done, "total": total, "percent": percent}
\ No newline at end of file
+    return {"done": done, "total": total, "percent": percent}
+
+
+def rebuild_checklist_counters(db: Session) -> int:
+    """
+    Пересчитывает done_count/total_count по пунктам (ремонт после ручных правок БД и т.п.).
+    Возвращает число исправленных чек-листов.
+    """
+    done = (
+        select(func.count())
+        .where(PatientChecklistItem.patient_checklist_id == PatientChecklist.id, PatientChecklistItem.done.is_(True))
+        .scalar_subquery()
+    )
+    total = (
+        select(func.count())
+        .where(PatientChecklistItem.patient_checklist_id == PatientChecklist.id)
+        .scalar_subquery()
+    )
+    fixed = db.execute(
+        update(PatientChecklist)
+        .where(or_(PatientChecklist.done_count != done, PatientChecklist.total_count != total))
+        .values(done_count=done, total_count=total)
+        .returning(PatientChecklist.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    record_changes(db, PatientChecklist, fixed)
+    db.commit()
+    return len(fixed)
+
+
+def get_checklist_view(db: Session, checklist: PatientChecklist) -> PatientChecklistViewOut:
+    """
+    Чек-лист для UI одним ответом: пункты + метаданные шаблона + число файлов + прогресс.
+    checklist должен прийти с items и item_template (get_latest_for_patient_with_items);
+    здесь — ещё один запрос: количество файлов по пунктам (GROUP BY).
+    """
+    item_ids = [i.id for i in checklist.items]
+    files_count: dict[int, int] = {}
+    if item_ids:
+        files_count = dict(
+            db.query(FileAsset.checklist_item_id, func.count(FileAsset.id))
+            .filter(FileAsset.checklist_item_id.in_(item_ids))
+            .group_by(FileAsset.checklist_item_id)
+            .all()
+        )
+
+    items = sorted(checklist.items, key=lambda i: (i.item_template.order_index, i.id))
+    return PatientChecklistViewOut(
+        id=checklist.id,
+        patient_id=checklist.patient_id,
+        template_id=checklist.template_id,
+        status=checklist.status,
+        version=checklist.version,
+        created_at=checklist.created_at,
+        updated_at=checklist.updated_at,
+        progress=PatientChecklistProgressOut(**get_checklist_progress(db, checklist)),
+        items=[
+            ChecklistViewItemOut(
+                id=i.id,
+                item_template_id=i.item_template_id,
+                title=i.item_template.title,
+                description=i.item_template.description,
+                order_index=i.item_template.order_index,
+                requires_file=i.item_template.requires_file,
+                requires_value=i.item_template.requires_value,
+                value_hint=i.item_template.value_hint,
+                done=i.done,
+                done_at=i.done_at,
+                value_text=i.value_text,
+                note=i.note,
+                files_count=files_count.get(i.id, 0),
+                updated_at=i.updated_at,
+            )
+            for i in items
+        ],
+    )
@@ -1,31 +1,73 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from src.db.session import get_db
+from src.db.async_session import AsyncSessionLocal
+from src.db import replicas
 from src.models.user import User
 from src.core.jwt import verify_token
+from src.core.principals import Principal, principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
-) -> User:
+) -> Principal:
     token_data = verify_token(token)
     if not token_data:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    user = db.query(User).filter(User.email == token_data.email).one_or_none()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    if not user.is_active:
+    # в обычном случае — ни одного запроса к users
+    principal = principal_cache.get(token_data.email)
+    if principal is None:
+        user = db.query(User).filter(User.email == token_data.email).one_or_none()
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        principal = Principal.from_user(user)
+        principal_cache.set(token_data.email, principal)
+
+    if not principal.is_active:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User inactive")
-    return user
+    # для read-your-writes (src.db.replicas.read_your_writes_middleware)
+    request.state.principal_id = principal.id
+    return principal
 
 def require_roles(*roles: str):
-    def _dep(user: User = Depends(get_current_user)) -> User:
+    def _dep(user: Principal = Depends(get_current_user)) -> Principal:
         if user.role.value not in roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
         return user
-    return _dep
\ No newline at end of file
+    return _dep
+
+def get_read_db(
+    request: Request,
+    user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Сессия для read-only эндпоинтов: реплика (round-robin), если они настроены
+    и пользователь недавно ничего не писал; иначе — обычная сессия primary.
+    """
+    if not replicas.replicas_enabled() or replicas.is_sticky(request, user.id):
+        yield db
+        return
+    read_db = replicas.ReplicaSessions[replicas.pick_replica()]()
+    try:
+        yield read_db
+    finally:
+        read_db.close()
+
+async def get_async_read_db(
+    request: Request,
+    user: Principal = Depends(get_current_user),
+):
+    """Async-вариант get_read_db."""
+    if not replicas.replicas_enabled() or replicas.is_sticky(request, user.id):
+        factory = AsyncSessionLocal
+    else:
+        factory = replicas.AsyncReplicaSessions[replicas.pick_replica()]
+    async with factory() as db:
+        yield db
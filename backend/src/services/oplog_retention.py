@@ -0,0 +1,212 @@
+"""
+Хранение operation_log: помесячные партиции (PostgreSQL), окно идемпотентности и архивация.
+
+- На PostgreSQL (OPLOG_PARTITIONING=true) таблица создаётся как PARTITION BY RANGE (created_at),
+  по партиции на месяц. Уникальность op_id — в пределах (op_id, created_at), а дедупликация
+  в sync смотрит только на последние OPLOG_IDEMPOTENCY_DAYS дней, так что поиск
+  затрагивает одну-две свежие партиции, а не всю историю. Параллельные повторы одного
+  op_id ловит непартиционированная operation_log_ids (op_id за то же окно).
+- Партиции старше OPLOG_RETENTION_DAYS выгружаются в OPLOG_ARCHIVE_DIR (*.jsonl.gz),
+  затем DETACH + DROP.
+- SQLite / уже существующая обычная таблица — fallback: те же файлы архива + DELETE пачками.
+
+Запуск обслуживания: python -m src.manage oplog-maintenance
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.models.oplog import OperationLog, OperationLogId
+
+logger = logging.getLogger(__name__)
+
+TABLE = OperationLog.__tablename__
+ARCHIVE_BATCH_SIZE = 5000
+
+_PARTITIONED_DDL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    id BIGSERIAL,
+    op_id VARCHAR(64) NOT NULL,
+    action VARCHAR(64) NOT NULL,
+    payload JSONB NOT NULL,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, created_at),
+    CONSTRAINT uq_operation_log_op_id UNIQUE (op_id, created_at)
+) PARTITION BY RANGE (created_at)
+"""
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def idempotency_cutoff() -> datetime:
+    """Операции старше этой отметки для дедупликации уже не учитываются."""
+    return _utcnow() - timedelta(days=settings.OPLOG_IDEMPOTENCY_DAYS)
+
+
+def _month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month = dt.month - 1 + months
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"{TABLE}_{month:%Y_%m}"
+
+
+def _uses_partitioning(bind: Engine | Connection) -> bool:
+    return settings.OPLOG_PARTITIONING and bind.dialect.name == "postgresql"
+
+
+def _is_partitioned(conn: Connection) -> bool:
+    return bool(conn.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name)"
+    ), {"name": TABLE}))
+
+
+def create_partitioned_table(engine: Engine) -> None:
+    """
+    Вызывается из init_db до create_all: на PostgreSQL создаёт operation_log партиционированной.
+    Существующую обычную таблицу не трогаем — для неё работает fallback.
+    """
+    if not _uses_partitioning(engine):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(_PARTITIONED_DDL))
+        if not _is_partitioned(conn):
+            logger.warning("%s exists as a plain table; partitioning is skipped", TABLE)
+            return
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_user_id ON {TABLE} (user_id)"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_action ON {TABLE} (action)"))
+        # страховка: если партицию на месяц не успели создать, вставка не упадёт
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT"))
+    ensure_partitions(engine)
+
+
+def ensure_partitions(engine: Engine, months_ahead: int | None = None) -> None:
+    """Создаёт партиции на текущий месяц и months_ahead месяцев вперёд."""
+    if not _uses_partitioning(engine):
+        return
+    months_ahead = settings.OPLOG_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    with engine.begin() as conn:
+        if not _is_partitioned(conn):
+            return
+        start = _month_start(_utcnow())
+        for i in range(months_ahead + 1):
+            lo = _add_months(start, i)
+            hi = _add_months(start, i + 1)
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {_partition_name(lo)} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+            ))
+
+
+def _row_to_json(row) -> str:
+    return json.dumps({
+        "id": row.id,
+        "op_id": row.op_id,
+        "action": row.action,
+        "payload": row.payload,
+        "user_id": row.user_id,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }, ensure_ascii=False)
+
+
+def _archive_path(name: str) -> str:
+    os.makedirs(settings.OPLOG_ARCHIVE_DIR, exist_ok=True)
+    return os.path.join(settings.OPLOG_ARCHIVE_DIR, f"{name}.jsonl.gz")
+
+
+def _archive_partitions(engine: Engine, cutoff: datetime) -> int:
+    """Выгружает и удаляет целые партиции, целиком лежащие до cutoff."""
+    archived = 0
+    with engine.connect() as conn:
+        names = conn.scalars(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name ORDER BY c.relname"
+        ), {"name": TABLE}).all()
+
+    for name in names:
+        try:
+            month = datetime.strptime(name[len(TABLE) + 1:], "%Y_%m").replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue  # default-партиция и прочее
+        if _add_months(month, 1) > cutoff:
+            continue
+
+        with engine.begin() as conn:
+            rows = conn.execution_options(yield_per=ARCHIVE_BATCH_SIZE).execute(
+                text(f"SELECT id, op_id, action, payload, user_id, created_at FROM {name} ORDER BY id")
+            )
+            with gzip.open(_archive_path(name), "wt", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(_row_to_json(row) + "\n")
+            conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+        logger.info("archived partition %s", name)
+        archived += 1
+    return archived
+
+
+def _archive_plain(db: Session, cutoff: datetime) -> int:
+    """Fallback для обычной таблицы: пачками пишем в архив и удаляем."""
+    archived = 0
+    path = _archive_path(f"{TABLE}_before_{cutoff:%Y_%m_%d}")
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        while True:
+            rows = (
+                db.query(OperationLog)
+                .filter(OperationLog.created_at < cutoff)
+                .order_by(OperationLog.id.asc())
+                .limit(ARCHIVE_BATCH_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+            for row in rows:
+                f.write(_row_to_json(row) + "\n")
+            f.flush()
+            db.query(OperationLog).filter(OperationLog.id.in_([r.id for r in rows])).delete(synchronize_session=False)
+            db.commit()
+            db.expunge_all()
+            archived += len(rows)
+    return archived
+
+
+def _purge_op_ids(db: Session) -> None:
+    # op_id вне окна идемпотентности снова можно применить — в operation_log_ids они не нужны
+    db.query(OperationLogId).filter(OperationLogId.created_at < idempotency_cutoff()).delete(synchronize_session=False)
+    db.commit()
+
+
+def archive_operation_log(engine: Engine, db: Session) -> int:
+    """
+    Архивирует operation_log старше OPLOG_RETENTION_DAYS и чистит operation_log_ids.
+    Возвращает число выгруженных партиций (PostgreSQL) или строк (fallback).
+    """
+    _purge_op_ids(db)
+    retention_days = max(settings.OPLOG_RETENTION_DAYS, settings.OPLOG_IDEMPOTENCY_DAYS)
+    cutoff = _utcnow() - timedelta(days=retention_days)
+    if _uses_partitioning(engine):
+        with engine.connect() as conn:
+            partitioned = _is_partitioned(conn)
+        if partitioned:
+            return _archive_partitions(engine, cutoff)
+    return _archive_plain(db, cutoff)
@@ -0,0 +1,280 @@
+"""
+Поиск пациентов по ФИО, СНИЛС и полису в пределах организации.
+
+- Запрос в форме СНИЛС/полиса (цифры с разделителями, у старых полисов — короткая буквенная
+  серия) — поиск по идентификаторам: точное совпадение (нормализация как в validate_snils /
+  normalize_polis) и префикс. Строки, записанные до нормализации, приводит
+  normalize_patient_identifiers (init_db).
+- Иначе — ФИО: префикс, подстрока и нечёткое совпадение (опечатки); ё сравнивается как е.
+  PostgreSQL: pg_trgm, GIN-индексы по ФИО, snils, polis (ensure_search_indexes).
+  SQLite: триграммный индекс в памяти процесса, догоняется по журналу sync_changes.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from collections import Counter
+
+from sqlalchemy import case, func, literal, literal_column, or_, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.core.validators import validate_snils, normalize_polis
+from src.db.change_tracking import record_changes
+from src.models.patient import Patient
+from src.models.sync_change import SyncChange
+from src.models.user import User
+
+logger = logging.getLogger(__name__)
+
+MAX_SEARCH_LIMIT = 50
+# префикс идентификатора короче — слишком много совпадений и триграммный индекс не помогает
+MIN_IDENTIFIER_PREFIX = 4
+# доля общих триграмм запроса и слова ФИО для нечёткого совпадения (SQLite-индекс)
+FUZZY_THRESHOLD = 0.5
+# СНИЛС / полис ОМС без пробелов и дефисов: цифры, у полисов старого образца — буквенная серия впереди
+_IDENTIFIER_RE = re.compile(r"\d+|[A-ZА-ЯЁ]{1,3}\d{%d,}" % MIN_IDENTIFIER_PREFIX)
+
+_SEARCH_INDEXES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # выражение должно совпадать с _fio_expr(), иначе планировщик индекс не возьмёт
+    "DROP INDEX IF EXISTS ix_patients_fio_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_patients_fio_norm_trgm ON patients"
+    " USING gin (translate(lower(fio), 'ёЁ', 'ее') gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_patients_snils_trgm ON patients USING gin (snils gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_patients_polis_trgm ON patients USING gin (polis gin_trgm_ops)",
+)
+
+
+def ensure_search_indexes(engine: Engine) -> None:
+    """Триграммные индексы для поиска (только PostgreSQL; без прав на pg_trgm поиск работает, но медленнее)."""
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as conn:
+            for ddl in _SEARCH_INDEXES_DDL:
+                conn.execute(text(ddl))
+    except Exception:
+        logger.warning("patient search: pg_trgm indexes were not created", exc_info=True)
+
+
+def normalize_patient_identifiers(db: Session) -> int:
+    """
+    Приводит snils/polis, записанные до нормализации при записи, к виду validate_snils / normalize_polis,
+    иначе точный поиск по идентификатору их не находит. Возвращает число исправленных пациентов.
+    """
+    candidates = db.execute(
+        select(Patient.id, Patient.snils, Patient.polis).where(
+            or_(
+                Patient.snils.like("% %"),
+                Patient.snils.like("%-%"),
+                Patient.polis.like("% %"),
+                Patient.polis.like("%-%"),
+                Patient.polis != func.upper(Patient.polis),
+            )
+        )
+    ).all()
+    fixed = []
+    for patient_id, snils, polis in candidates:
+        values = {
+            "snils": re.sub(r"\D+", "", snils or "") or None,
+            "polis": normalize_polis(polis) or None,
+        }
+        if values != {"snils": snils, "polis": polis}:
+            db.execute(update(Patient).where(Patient.id == patient_id).values(**values))
+            fixed.append(patient_id)
+    record_changes(db, Patient, fixed)
+    db.commit()
+    if fixed:
+        logger.info("patient search: normalized identifiers of %d patient(s)", len(fixed))
+    return len(fixed)
+
+
+def _looks_like_identifier(q: str) -> bool:
+    return bool(_IDENTIFIER_RE.fullmatch(normalize_polis(q)))
+
+
+def _normalize_fio(q: str) -> str:
+    return " ".join(q.lower().replace("ё", "е").split())
+
+
+def _fio_expr():
+    # литералы, а не параметры: выражение должно совпасть с индексом ix_patients_fio_norm_trgm
+    return func.translate(func.lower(Patient.fio), literal_column("'ёЁ'"), literal_column("'ее'"))
+
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _trigrams(s: str) -> set[str]:
+    # как в pg_trgm: каждое слово дополняется двумя пробелами слева и одним справа
+    out: set[str] = set()
+    for word in s.split():
+        padded = f"  {word} "
+        out.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return out
+
+
+class FioIndex:
+    """
+    Триграммный индекс ФИО в памяти процесса (fallback для SQLite).
+    Строится при первом поиске, дальше догоняется по sync_changes (entity="patient"),
+    так что правки из других воркеров тоже видны.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[int, tuple[int | None, str]] = {}
+        self._postings: dict[str, set[int]] = {}
+        self._cursor: int | None = None
+
+    def _add(self, patient_id: int, org_id: int | None, fio: str) -> None:
+        fio_norm = _normalize_fio(fio or "")
+        self._entries[patient_id] = (org_id, fio_norm)
+        for tri in _trigrams(fio_norm):
+            self._postings.setdefault(tri, set()).add(patient_id)
+
+    def _remove(self, patient_id: int) -> None:
+        entry = self._entries.pop(patient_id, None)
+        if entry is None:
+            return
+        for tri in _trigrams(entry[1]):
+            ids = self._postings.get(tri)
+            if ids is not None:
+                ids.discard(patient_id)
+                if not ids:
+                    del self._postings[tri]
+
+    def _load(self, db: Session) -> None:
+        # курсор берём до снимка: изменения во время загрузки просто применятся повторно
+        self._cursor = db.query(func.max(SyncChange.id)).scalar() or 0
+        self._entries.clear()
+        self._postings.clear()
+        for patient_id, org_id, fio in db.query(Patient.id, Patient.organization_id, Patient.fio):
+            self._add(patient_id, org_id, fio)
+
+    def _refresh(self, db: Session) -> None:
+        if self._cursor is None:
+            self._load(db)
+            return
+        changes = (
+            db.query(SyncChange.id, SyncChange.entity_id)
+            .filter(SyncChange.id > self._cursor, SyncChange.entity == "patient")
+            .order_by(SyncChange.id.asc())
+            .all()
+        )
+        if not changes:
+            return
+        self._cursor = changes[-1].id
+        ids = {c.entity_id for c in changes}
+        for patient_id in ids:
+            self._remove(patient_id)
+        rows = db.query(Patient.id, Patient.organization_id, Patient.fio).filter(Patient.id.in_(ids))
+        for patient_id, org_id, fio in rows:
+            self._add(patient_id, org_id, fio)
+
+    def search(self, db: Session, q: str, org_id: int | None, limit: int) -> list[int]:
+        query_tris = _trigrams(q)
+        with self._lock:
+            self._refresh(db)
+            counts: Counter[int] = Counter()
+            for tri in query_tris:
+                counts.update(self._postings.get(tri, ()))
+
+            ranked = []
+            for patient_id, shared in counts.items():
+                entry_org, fio = self._entries[patient_id]
+                if org_id is not None and entry_org != org_id:
+                    continue
+                score = shared / len(query_tris)
+                if fio.startswith(q) or f" {q}" in fio:
+                    rank = 0
+                elif q in fio:
+                    rank = 1
+                elif score >= FUZZY_THRESHOLD:
+                    rank = 2
+                else:
+                    continue
+                ranked.append((rank, -score, fio, patient_id))
+
+        ranked.sort()
+        return [patient_id for *_, patient_id in ranked[:limit]]
+
+
+fio_index = FioIndex()
+
+
+def _search_identifiers(db: Session, q: str, org_id: int | None, limit: int) -> list[Patient]:
+    polis = normalize_polis(q)
+    digits = re.sub(r"\D+", "", q)
+    try:
+        snils = validate_snils(q)
+    except ValueError:
+        snils = None
+
+    exact = [Patient.polis == polis]
+    if snils:
+        exact.append(Patient.snils == snils)
+    conditions = list(exact)
+    if len(polis) >= MIN_IDENTIFIER_PREFIX:
+        conditions.append(Patient.polis.like(f"{_like_escape(polis)}%", escape="\\"))
+    if digits == polis and len(digits) >= MIN_IDENTIFIER_PREFIX:
+        conditions.append(Patient.snils.like(f"{_like_escape(digits)}%", escape="\\"))
+
+    query = db.query(Patient).filter(or_(*conditions))
+    if org_id is not None:
+        query = query.filter(Patient.organization_id == org_id)
+    return query.order_by(case((or_(*exact), 0), else_=1), Patient.fio.asc()).limit(limit).all()
+
+
+def _search_fio_pg(db: Session, q: str, org_id: int | None, limit: int) -> list[Patient]:
+    fio = _fio_expr()
+    escaped = _like_escape(q)
+    substring = fio.like(f"%{escaped}%", escape="\\")
+    prefix = or_(fio.like(f"{escaped}%", escape="\\"), fio.like(f"% {escaped}%", escape="\\"))
+    # q <% fio: word_similarity выше порога pg_trgm — ловит опечатки; индекс тот же GIN
+    fuzzy = literal(q).op("<%")(fio)
+
+    query = db.query(Patient).filter(or_(substring, fuzzy))
+    if org_id is not None:
+        query = query.filter(Patient.organization_id == org_id)
+    return (
+        query.order_by(
+            case((prefix, 0), (substring, 1), else_=2),
+            func.word_similarity(q, fio).desc(),
+            Patient.fio.asc(),
+        )
+        .limit(limit)
+        .all()
+    )
+
+
+def _search_fio_fallback(db: Session, q: str, org_id: int | None, limit: int) -> list[Patient]:
+    ids = fio_index.search(db, q, org_id, limit)
+    if not ids:
+        return []
+    by_id = {p.id: p for p in db.query(Patient).filter(Patient.id.in_(ids))}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def search_patients(db: Session, user: User, q: str, limit: int = 20) -> list[Patient]:
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    q = q.strip()
+    if not q:
+        return []
+
+    org_id = None
+    if user.role.value != "admin":
+        if user.organization_id is None:
+            return []
+        org_id = user.organization_id
+
+    if _looks_like_identifier(q):
+        return _search_identifiers(db, q, org_id, limit)
+
+    q = _normalize_fio(q)
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_fio_pg(db, q, org_id, limit)
+    return _search_fio_fallback(db, q, org_id, limit)
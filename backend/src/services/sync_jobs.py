@@ -0,0 +1,222 @@
+"""
+Фоновые job для больших /sync/batch.
+
+Ops job живут только в памяти принявшего её процесса (worker_id). Пока job в очереди
+или выполняется, процесс раз в SYNC_JOB_HEARTBEAT_SECONDS обновляет heartbeat_at своих job.
+Job без отметки дольше SYNC_JOB_ORPHAN_SECONDS брошена (процесс умер) — её помечаем failed:
+при старте, при опросе статуса и в цикле heartbeat. Клиент переотправит пачку — ops
+дедуплицируются по op_id. Итоговый статус пишется только поверх running, поэтому
+job, уже признанная брошенной, не «оживает».
+"""
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.db.session import SessionLocal
+from src.models import SyncJob, User
+from src.schemas.oplog import OpIn
+from src.services.sync_service import apply_batch
+
+logger = logging.getLogger(__name__)
+
+# отдельный пул: медленные пачки не занимают воркеры, обслуживающие HTTP
+_executor = ThreadPoolExecutor(max_workers=settings.SYNC_JOB_WORKERS, thread_name_prefix="sync-job")
+
+# ops ожидающих job лежат в памяти процесса: очередь ограничена SYNC_JOB_MAX_PENDING
+_pending = 0
+_pending_lock = threading.Lock()
+
+PENDING_STATUSES = ("queued", "running")
+
+# уникален на каждый запуск процесса: pid после рестарта контейнера может повториться
+WORKER_ID = f"{socket.gethostname()[:32]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_heartbeat_thread: threading.Thread | None = None
+_heartbeat_lock = threading.Lock()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _orphaned():
+    cutoff = _utcnow() - timedelta(seconds=settings.SYNC_JOB_ORPHAN_SECONDS)
+    return and_(
+        SyncJob.status.in_(PENDING_STATUSES),
+        or_(SyncJob.heartbeat_at.is_(None), SyncJob.heartbeat_at < cutoff),
+    )
+
+
+def fail_orphaned_jobs(db: Session, job_id: str | None = None) -> int:
+    """
+    Помечает failed брошенные job (владелец перестал отмечаться). job_id — только эту.
+    Возвращает число помеченных job.
+    """
+    query = update(SyncJob).where(_orphaned())
+    if job_id is not None:
+        query = query.where(SyncJob.id == job_id)
+    failed = db.execute(
+        query.values(status="failed", finished_at=_utcnow()).execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if failed:
+        logger.warning("sync jobs: marked %d orphaned job(s) as failed", failed)
+    return failed
+
+
+def _heartbeat_once() -> None:
+    with SessionLocal() as db:
+        db.execute(
+            update(SyncJob)
+            .where(SyncJob.worker_id == WORKER_ID, SyncJob.status.in_(PENDING_STATUSES))
+            .values(heartbeat_at=_utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        # заодно подбираем job умерших соседей, даже если их никто не опрашивает
+        fail_orphaned_jobs(db)
+
+
+def _heartbeat_loop() -> None:
+    while True:
+        time.sleep(settings.SYNC_JOB_HEARTBEAT_SECONDS)
+        with _pending_lock:
+            busy = _pending > 0
+        if not busy:
+            continue
+        try:
+            _heartbeat_once()
+        except Exception:
+            logger.exception("sync jobs: heartbeat failed")
+
+
+def _ensure_heartbeat() -> None:
+    global _heartbeat_thread
+    with _heartbeat_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name="sync-job-heartbeat", daemon=True)
+            _heartbeat_thread.start()
+
+
+def _reserve_slot(db: Session, user: User) -> None:
+    global _pending
+    pending_for_user = (
+        db.query(SyncJob.id)
+        .filter(
+            SyncJob.user_id == user.id,
+            SyncJob.status.in_(PENDING_STATUSES),
+            ~_orphaned(),
+        )
+        .count()
+    )
+    if pending_for_user >= settings.SYNC_JOB_MAX_PENDING_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many pending sync jobs",
+            headers={"Retry-After": "5"},
+        )
+    with _pending_lock:
+        if _pending >= settings.SYNC_JOB_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Sync job queue is full, retry later",
+                headers={"Retry-After": "5"},
+            )
+        _pending += 1
+
+
+def _release_slot() -> None:
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def submit_batch_job(db: Session, ops: Sequence[OpIn], user: User) -> SyncJob:
+    """
+    Ставит пачку в очередь и сразу возвращает запись job (status=queued).
+    Повторная отправка той же пачки безопасна — ops дедуплицируются по op_id.
+    Очередь полна -> 503, у пользователя слишком много незавершённых job -> 429.
+    """
+    _reserve_slot(db, user)
+    try:
+        job = SyncJob(
+            id=uuid.uuid4().hex,
+            user_id=user.id,
+            status="queued",
+            total_ops=len(ops),
+            worker_id=WORKER_ID,
+            heartbeat_at=_utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        _ensure_heartbeat()
+        _executor.submit(_run_job, job.id, list(ops), user.id)
+    except Exception:
+        _release_slot()
+        raise
+    return job
+
+
+def _run_job(job_id: str, ops: list[OpIn], user_id: int) -> None:
+    try:
+        _execute_job(job_id, ops, user_id)
+    finally:
+        _release_slot()
+
+
+def _set_status(db: Session, job_id: str, expected: str, **values) -> bool:
+    """Переход статуса только из expected: брошенную (уже failed) job не перезаписываем."""
+    changed = db.execute(
+        update(SyncJob)
+        .where(SyncJob.id == job_id, SyncJob.status == expected)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(changed)
+
+
+def _execute_job(job_id: str, ops: list[OpIn], user_id: int) -> None:
+    with SessionLocal() as db:
+        if not _set_status(db, job_id, "queued", status="running", started_at=_utcnow(), heartbeat_at=_utcnow()):
+            return
+
+        try:
+            user = db.get(User, user_id)
+            if not user or not user.is_active:
+                raise RuntimeError("User not found or inactive")
+            values = {"status": "done", "result": apply_batch(db, ops, user=user).model_dump()}
+        except Exception:
+            logger.exception("sync job %s failed", job_id)
+            db.rollback()
+            values = {"status": "failed"}
+
+        if not _set_status(db, job_id, "running", finished_at=_utcnow(), **values):
+            logger.warning("sync job %s was already marked failed; %s result dropped", job_id, values["status"])
+
+
+def get_job_for_user(db: Session, job_id: str, user: User) -> SyncJob | None:
+    job = db.get(SyncJob, job_id)
+    if not job:
+        return None
+    # чужие job не показываем (кроме admin)
+    if user.role.value != "admin" and job.user_id != user.id:
+        return None
+    # процесс-владелец умер — не держим клиента в ожидании
+    if job.status in PENDING_STATUSES and fail_orphaned_jobs(db, job_id):
+        db.refresh(job)
+    return job
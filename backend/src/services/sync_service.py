@@ -1,25 +1,66 @@
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional, Sequence
+
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime, timezone
 
-from src.models import OperationLog, Patient, User
-from src.schemas.oplog import OpIn, OpResult
+from src.models import OperationLog, OperationLogId, Patient, User
+from src.schemas.oplog import OpIn, OpResult, BatchOut
 from src.models.patient import PatientStatus
+from src.core.metrics import LabeledLatency
+from src.services.oplog_retention import idempotency_cutoff
+
+
+# сколько значений отправляем в один IN (...), чтобы не упереться в лимит параметров
+PRELOAD_CHUNK_SIZE = 1000
+
+
+@dataclass
+class BatchPreload:
+    """
+    Данные, заранее загруженные для всей пачки операций:
+    - seen_op_ids: op_id, которые уже есть в operation_log (или применены в этой пачке)
+    - patients: patient_id -> Patient для всех пациентов, на которые ссылаются ops
+    """
+    seen_op_ids: set[str] = field(default_factory=set)
+    patients: dict[int, Patient] = field(default_factory=dict)
+
+
+# обработчик: (db, op, user, patient) -> None если применено, иначе OpResult с ошибкой.
+# patient передаётся только действиям с preload={"patient"} (уже проверенный по org scope)
+ActionHandler = Callable[[Session, OpIn, User, Optional[Patient]], Optional[OpResult]]
+
+
+@dataclass(frozen=True)
+class SyncAction:
+    name: str
+    roles: frozenset[str]
+    handler: ActionHandler
+    preload: frozenset[str] = frozenset()  # какие сущности действие трогает: {"patient"}
+
 
+ACTIONS: dict[str, SyncAction] = {}
 
-SUPPORTED_ACTIONS = {
-    "create_patient",
-    "submit_for_review",
-    "surgeon_approve",
-    "surgeon_request_changes",
-}
+# латентность и ошибки по action — ищем «горячие» действия под нагрузкой
+ACTION_METRICS = LabeledLatency()
 
-# какие роли могут делать какие действия
-ACTION_ROLES = {
-    "create_patient": {"admin", "feldsher"},
-    "submit_for_review": {"admin", "feldsher"},
-    "surgeon_approve": {"admin", "surgeon"},
-    "surgeon_request_changes": {"admin", "surgeon"},
-}
+
+def register_action(name: str, roles: Iterable[str], preload: Iterable[str] = ()):
+    """
+    Регистрирует обработчик sync-действия:
+
+        @register_action("surgeon_approve", roles={"admin", "surgeon"}, preload={"patient"})
+        def _surgeon_approve(db, op, user, patient): ...
+    """
+    def decorator(handler: ActionHandler) -> ActionHandler:
+        ACTIONS[name] = SyncAction(name=name, roles=frozenset(roles), handler=handler, preload=frozenset(preload))
+        return handler
+    return decorator
 
 
 def _forbidden(op_id: str) -> OpResult:
@@ -30,11 +71,34 @@ def _bad_request(op_id: str, msg: str) -> OpResult:
     return OpResult(op_id=op_id, status="error", message=msg)
 
 
-def _ensure_action_allowed(user: User, op: OpIn) -> bool:
-    allowed = ACTION_ROLES.get(op.action)
-    if not allowed:
-        return False
-    return user.role.value in allowed
+def _duplicate(op_id: str) -> OpResult:
+    return OpResult(op_id=op_id, status="duplicate")
+
+
+# constraint'ы, нарушение которых означает повтор op_id (PostgreSQL)
+OP_ID_CONSTRAINTS = frozenset({"pk_operation_log_ids_op_id", "uq_operation_log_op_id"})
+# SQLite имён constraint не сообщает — только «UNIQUE constraint failed: <table>.<column>, ...»
+_SQLITE_OP_ID_COLUMNS = ("UNIQUE constraint failed: operation_log_ids.op_id", "UNIQUE constraint failed: operation_log.op_id,")
+
+
+def _is_op_id_conflict(e: IntegrityError) -> bool:
+    """unique violation именно на op_id; прочие нарушения целостности — обычная ошибка операции."""
+    orig = e.orig
+    diag = getattr(orig, "diag", None)
+    if diag is not None:
+        # psycopg2: pgcode, psycopg 3: sqlstate; 23505 — unique_violation
+        sqlstate = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+        return sqlstate == "23505" and diag.constraint_name in OP_ID_CONSTRAINTS
+    return str(orig).startswith(_SQLITE_OP_ID_COLUMNS)
+
+
+def _conflict(op_id: str) -> OpResult:
+    # клиенту стоит перечитать пациента (/sync/changes) и решить, повторять ли операцию
+    return OpResult(op_id=op_id, status="conflict", message="Patient was modified concurrently")
+
+
+def _ensure_action_allowed(user: User, action: SyncAction) -> bool:
+    return user.role.value in action.roles
 
 
 def _ensure_patient_scope(user: User, patient: Patient) -> bool:
@@ -46,78 +110,275 @@ def _ensure_patient_scope(user: User, patient: Patient) -> bool:
     return user.organization_id == patient.organization_id
 
 
-def apply_op(db: Session, op: OpIn, user: User) -> OpResult:
+def _chunks(values: Sequence, size: int = PRELOAD_CHUNK_SIZE) -> Iterable[Sequence]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _payload_patient_id(op: OpIn) -> int | None:
+    pid = (op.payload or {}).get("patient_id")
+    if not pid:
+        return None
+    try:
+        return int(pid)
+    except (TypeError, ValueError):
+        return None
+
+
+def preload_batch(db: Session, ops: Sequence[OpIn]) -> BatchPreload:
+    """
+    Вместо двух запросов на каждую операцию — пара запросов на всю пачку:
+    все op_id одним IN (...) и все patient_id одним IN (...).
+    """
+    preload = BatchPreload()
+
+    # только окно идемпотентности: на партиционированной таблице это одна-две свежие партиции
+    cutoff = idempotency_cutoff()
+    op_ids = list({op.op_id for op in ops})
+    for chunk in _chunks(op_ids):
+        rows = (
+            db.query(OperationLog.op_id)
+            .filter(OperationLog.op_id.in_(chunk), OperationLog.created_at >= cutoff)
+            .all()
+        )
+        preload.seen_op_ids.update(r.op_id for r in rows)
+
+    patient_ids = list({
+        pid for op in ops
+        if (action := ACTIONS.get(op.action)) is not None and "patient" in action.preload
+        and (pid := _payload_patient_id(op)) is not None
+    })
+    for chunk in _chunks(patient_ids):
+        for p in db.query(Patient).filter(Patient.id.in_(chunk)).all():
+            preload.patients[p.id] = p
+
+    return preload
+
+
+def _is_duplicate(db: Session, op: OpIn, preload: BatchPreload | None) -> bool:
+    if preload is not None:
+        return op.op_id in preload.seen_op_ids
+    return (
+        db.query(OperationLog.id)
+        .filter(OperationLog.op_id == op.op_id, OperationLog.created_at >= idempotency_cutoff())
+        .first()
+        is not None
+    )
+
+
+def _get_patient(db: Session, patient_id: int, preload: BatchPreload | None) -> Patient | None:
+    if preload is not None and patient_id in preload.patients:
+        return preload.patients[patient_id]
+    # не попал в предзагрузку (например, id нет в БД) — обычный get
+    return db.get(Patient, patient_id)
+
+
+# ---- действия ----
+
+@register_action("create_patient", roles={"admin", "feldsher"})
+def _create_patient(db: Session, op: OpIn, user: User, patient: Patient | None) -> OpResult | None:
+    payload = op.payload or {}
+    fio = payload.get("fio") or "Без имени"
+
+    # org scope: если не admin, пациент создаётся в org пользователя
+    org_id = payload.get("organization_id")
+    if user.role.value != "admin":
+        org_id = user.organization_id
+
+    p = Patient(
+        fio=fio,
+        status=PatientStatus.NEW,
+        organization_id=org_id,
+    )
+    db.add(p)
+    db.flush()
+    return None
+
+
+@register_action("submit_for_review", roles={"admin", "feldsher"}, preload={"patient"})
+def _submit_for_review(db: Session, op: OpIn, user: User, p: Patient | None) -> OpResult | None:
+    # пример: запретить отправку на ревью, если уже APPROVED
+    if p.status in (PatientStatus.APPROVED, PatientStatus.SURGERY_DONE):
+        return _bad_request(op.op_id, "Invalid status transition")
+    p.status = PatientStatus.READY_FOR_REVIEW
+    return None
+
+
+@register_action("surgeon_approve", roles={"admin", "surgeon"}, preload={"patient"})
+def _surgeon_approve(db: Session, op: OpIn, user: User, p: Patient | None) -> OpResult | None:
+    # логика: хирург может approve только если READY_FOR_REVIEW
+    if p.status != PatientStatus.READY_FOR_REVIEW:
+        return _bad_request(op.op_id, "Invalid status transition")
+    p.status = PatientStatus.APPROVED
+    return None
+
+
+@register_action("surgeon_request_changes", roles={"admin", "surgeon"}, preload={"patient"})
+def _surgeon_request_changes(db: Session, op: OpIn, user: User, p: Patient | None) -> OpResult | None:
+    if p.status != PatientStatus.READY_FOR_REVIEW:
+        return _bad_request(op.op_id, "Invalid status transition")
+    p.status = PatientStatus.REVISION_REQUIRED
+    return None
+
+
+def _apply_op(db: Session, op: OpIn, user: User, preload: BatchPreload | None) -> OpResult:
+    """
+    Логика одной операции без commit/rollback — транзакцией управляет вызывающий
+    (apply_op — commit на операцию, apply_batch — SAVEPOINT на операцию).
+    """
     # 1) идемпотентность
-    if db.query(OperationLog).filter(OperationLog.op_id == op.op_id).one_or_none():
-        return OpResult(op_id=op.op_id, status="duplicate")
+    if _is_duplicate(db, op, preload):
+        return _duplicate(op.op_id)
 
-    if op.action not in SUPPORTED_ACTIONS:
+    action = ACTIONS.get(op.action)
+    if action is None:
         return _bad_request(op.op_id, "Unsupported action")
 
     # 2) проверка ролей на действие (RBAC)
-    if not _ensure_action_allowed(user, op):
+    if not _ensure_action_allowed(user, action):
         return _forbidden(op.op_id)
 
     payload = op.payload or {}
 
+    p = None
+    if "patient" in action.preload:
+        pid = payload.get("patient_id")
+        if not pid:
+            return _bad_request(op.op_id, "patient_id is required")
+
+        p = _get_patient(db, int(pid), preload)
+        if not p:
+            return _bad_request(op.op_id, "patient not found")
+
+        # org scope check (закрывает IDOR)
+        if not _ensure_patient_scope(user, p):
+            return _forbidden(op.op_id)
+
+        # клиент может прислать версию, которую видел офлайн: переход поверх чужих изменений не применяем
+        expected_version = payload.get("version")
+        if expected_version is not None and str(expected_version) != str(p.version):
+            return _conflict(op.op_id)
+
+    # 3) применяем действие
+    error = action.handler(db, op, user, p)
+    if error is not None:
+        return error
+
+    if p is not None:
+        p.updated_at = datetime.now(timezone.utc)
+        db.add(p)
+
+    # 4) логируем операцию (в payload можно оставить как есть);
+    # operation_log_ids — гарантия уникальности op_id от параллельных повторов (см. OperationLogId)
+    db.add(OperationLog(op_id=op.op_id, action=op.action, payload=payload, user_id=user.id))
+    db.add(OperationLogId(op_id=op.op_id))
+    return OpResult(op_id=op.op_id, status="applied")
+
+
+def _observe(op: OpIn, started: float, result: OpResult) -> None:
+    # неизвестные action сводим в одну метку, чтобы клиент не раздувал набор метрик
+    label = op.action if op.action in ACTIONS else "<unsupported>"
+    ACTION_METRICS.observe(label, (time.perf_counter() - started) * 1000, error=result.status in ("error", "conflict"))
+
+
+def _internal_error(op_id: str) -> OpResult:
+    # A10: не отдаём клиенту детали исключения
+    return OpResult(op_id=op_id, status="error", message="Internal error")
+
+
+def apply_op(db: Session, op: OpIn, user: User, preload: BatchPreload | None = None) -> OpResult:
+    """
+    Одна операция в своей транзакции: commit сразу после применения.
+    """
+    started = time.perf_counter()
     try:
-        # 3) применяем действие
-        if op.action == "create_patient":
-            fio = payload.get("fio") or "Без имени"
-
-            # org scope: если не admin, пациент создаётся в org пользователя
-            org_id = payload.get("organization_id")
-            if user.role.value != "admin":
-                org_id = user.organization_id
-
-            p = Patient(
-                fio=fio,
-                status=PatientStatus.NEW,
-                organization_id=org_id,
-            )
-            db.add(p)
-            db.flush()
+        r = _apply_op(db, op, user, preload)
+        if r.status == "applied":
+            db.commit()  # UPDATE ... WHERE version = ? — параллельная запись даст StaleDataError
+            if preload is not None:
+                preload.seen_op_ids.add(op.op_id)
+    except StaleDataError:
+        db.rollback()
+        r = _conflict(op.op_id)
+    except IntegrityError as e:
+        # тот же op_id успел закоммитить параллельный запрос
+        db.rollback()
+        r = _duplicate(op.op_id) if _is_op_id_conflict(e) else _internal_error(op.op_id)
+    except Exception:
+        db.rollback()
+        r = _internal_error(op.op_id)
+    _observe(op, started, r)
+    return r
+
 
+def _apply_op_in_savepoint(db: Session, op: OpIn, user: User, preload: BatchPreload) -> OpResult:
+    # ошибка откатывает только изменения этой операции, остальная пачка живёт
+    started = time.perf_counter()
+    savepoint = db.begin_nested()
+    try:
+        r = _apply_op(db, op, user, preload)
+        if r.status == "applied":
+            savepoint.commit()  # RELEASE SAVEPOINT (flush происходит здесь)
+            preload.seen_op_ids.add(op.op_id)
         else:
-            pid = payload.get("patient_id")
-            if not pid:
-                return _bad_request(op.op_id, "patient_id is required")
-
-            p = db.get(Patient, int(pid))
-            if not p:
-                return _bad_request(op.op_id, "patient not found")
-
-            # org scope check (закрывает IDOR)
-            if not _ensure_patient_scope(user, p):
-                return _forbidden(op.op_id)
-
-            # state transitions
-            if op.action == "submit_for_review":
-                # пример: запретить отправку на ревью, если уже APPROVED
-                if p.status in (PatientStatus.APPROVED, PatientStatus.SURGERY_DONE):
-                    return _bad_request(op.op_id, "Invalid status transition")
-                p.status = PatientStatus.READY_FOR_REVIEW
-
-            elif op.action == "surgeon_approve":
-                # логика: хирург может approve только если READY_FOR_REVIEW
-                if p.status != PatientStatus.READY_FOR_REVIEW:
-                    return _bad_request(op.op_id, "Invalid status transition")
-                p.status = PatientStatus.APPROVED
-
-            elif op.action == "surgeon_request_changes":
-                if p.status != PatientStatus.READY_FOR_REVIEW:
-                    return _bad_request(op.op_id, "Invalid status transition")
-                p.status = PatientStatus.REVISION_REQUIRED
-
-            p.updated_at = datetime.now(timezone.utc)
-            db.add(p)
-
-        # 4) логируем операцию (в payload можно оставить как есть)
-        db.add(OperationLog(op_id=op.op_id, action=op.action, payload=payload, user_id=user.id))
-        db.commit()
-        return OpResult(op_id=op.op_id, status="applied")
+            savepoint.rollback()
+    except StaleDataError:
+        savepoint.rollback()
+        r = _conflict(op.op_id)
+    except IntegrityError as e:
+        savepoint.rollback()
+        r = _duplicate(op.op_id) if _is_op_id_conflict(e) else _internal_error(op.op_id)
+    except Exception:
+        savepoint.rollback()
+        r = _internal_error(op.op_id)
+    _observe(op, started, r)
+    return r
+
+
+def apply_batch(db: Session, ops: Sequence[OpIn], user: User) -> BatchOut:
+    """
+    Применяет пачку операций по порядку в одной транзакции, SAVEPOINT на каждую операцию.
+    Идемпотентность и пациенты резолвятся заранее через preload_batch,
+    commit (и fsync/WAL flush) — один на всю пачку.
+    """
+    preload = preload_batch(db, ops)
 
+    results = [_apply_op_in_savepoint(db, op, user, preload) for op in ops]
+
+    try:
+        db.commit()
     except Exception:
         db.rollback()
-        # A10: не отдаём клиенту детали исключения
-        return OpResult(op_id=op.op_id, status="error", message="Internal error")
\ No newline at end of file
+        # транзакция не закоммитилась — ни одна операция на самом деле не применена
+        results = [_internal_error(r.op_id) if r.status == "applied" else r for r in results]
+
+    applied_ids = [r.op_id for r in results if r.status == "applied"]
+    return BatchOut(results=results, applied_ids=applied_ids)
+
+
+def parse_ndjson_op(line: bytes) -> OpIn | OpResult:
+    """
+    Разбирает одну строку NDJSON в OpIn. Битая строка не валит весь поток —
+    вместо неё возвращается OpResult с ошибкой (op_id, если удалось его достать).
+    """
+    try:
+        return OpIn.model_validate_json(line)
+    except ValidationError:
+        op_id = ""
+        try:
+            raw = json.loads(line)
+            if isinstance(raw, dict) and raw.get("op_id") is not None:
+                op_id = str(raw["op_id"])[:64]
+        except ValueError:
+            pass
+        return OpResult(op_id=op_id, status="error", message="Invalid op")
+
+
+def apply_ndjson_chunk(db: Session, items: Sequence[OpIn | OpResult], user: User) -> list[OpResult]:
+    """
+    Применяет кусок потока через apply_batch; ошибки разбора остаются на своих местах,
+    чтобы порядок результатов совпадал с порядком строк.
+    """
+    ops = [x for x in items if isinstance(x, OpIn)]
+    applied = iter(apply_batch(db, ops, user=user).results if ops else [])
+    return [next(applied) if isinstance(x, OpIn) else x for x in items]
\ No newline at end of file
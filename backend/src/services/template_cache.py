@@ -0,0 +1,184 @@
+"""
+Кэш шаблонов чек-листов в памяти процесса.
+
+Шаблоны меняются редко, а читаются на каждой генерации и каждом обновлении пункта.
+Снимки (frozen dataclass) живут в процессе; согласованность между воркерами —
+через строку cache_versions (создаётся в init_db): запись шаблона увеличивает version
+в той же транзакции, остальные воркеры сверяют её не чаще раза
+в TEMPLATE_CACHE_CHECK_SECONDS и при расхождении сбрасывают кэш целиком.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.crud.checklists import template_crud, template_item_crud
+from src.models.cache_version import CacheVersion
+from src.models.checklist import ChecklistTemplate, ChecklistItemTemplate
+
+CACHE_NAME = "checklist_templates"
+
+
+@dataclass(frozen=True)
+class ItemTemplateSnapshot:
+    id: int
+    template_id: int
+    title: str
+    description: Optional[str]
+    order_index: int
+    requires_file: bool
+    requires_value: bool
+    value_hint: Optional[str]
+    kind: Optional[str]
+
+    @classmethod
+    def from_model(cls, it: ChecklistItemTemplate) -> "ItemTemplateSnapshot":
+        return cls(
+            id=it.id,
+            template_id=it.template_id,
+            title=it.title,
+            description=it.description,
+            order_index=it.order_index,
+            requires_file=it.requires_file,
+            requires_value=it.requires_value,
+            value_hint=it.value_hint,
+            kind=getattr(it, "kind", None),
+        )
+
+
+@dataclass(frozen=True)
+class TemplateSnapshot:
+    id: int
+    title: str
+    operation_type: str
+    version: int
+    is_active: bool
+    items: tuple[ItemTemplateSnapshot, ...]
+
+
+class TemplateCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # растёт на каждый сброс: снимок, прочитанный до сброса, в кэш уже не кладём
+        self._generation = 0
+        self._seen_version: Optional[int] = None
+        self._checked_at = 0.0
+        self._by_id: dict[int, TemplateSnapshot] = {}
+        self._items: dict[int, ItemTemplateSnapshot] = {}
+        # operation_type -> id активного шаблона (None — активного нет)
+        self._active: dict[str, Optional[int]] = {}
+
+    def _reset(self) -> None:
+        self._generation += 1
+        self._by_id.clear()
+        self._items.clear()
+        self._active.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def _ensure_fresh(self, db: Session) -> None:
+        now = time.monotonic()
+        if self._seen_version is not None and now - self._checked_at < settings.TEMPLATE_CACHE_CHECK_SECONDS:
+            return
+        version = db.query(CacheVersion.version).filter(CacheVersion.name == CACHE_NAME).scalar() or 0
+        with self._lock:
+            if version != self._seen_version:
+                self._reset()
+                self._seen_version = version
+            self._checked_at = now
+
+    def _load(self, db: Session, template: ChecklistTemplate, generation: int) -> TemplateSnapshot:
+        items = tuple(ItemTemplateSnapshot.from_model(it) for it in template_item_crud.list_for_template(db, template.id))
+        snap = TemplateSnapshot(
+            id=template.id,
+            title=template.title,
+            operation_type=template.operation_type,
+            version=template.version,
+            is_active=template.is_active,
+            items=items,
+        )
+        with self._lock:
+            if generation == self._generation:
+                self._by_id[snap.id] = snap
+                for it in items:
+                    self._items[it.id] = it
+        return snap
+
+    def get_template(self, db: Session, template_id: int) -> Optional[TemplateSnapshot]:
+        self._ensure_fresh(db)
+        generation = self._generation
+        snap = self._by_id.get(template_id)
+        if snap is not None:
+            return snap
+        template = template_crud.get(db, template_id)
+        return self._load(db, template, generation) if template else None
+
+    def get_active_for_operation(self, db: Session, operation_type: str) -> Optional[TemplateSnapshot]:
+        self._ensure_fresh(db)
+        generation = self._generation
+        if operation_type in self._active:
+            template_id = self._active[operation_type]
+            if template_id is None:
+                return None
+            snap = self._by_id.get(template_id)
+            if snap is not None:
+                return snap
+        template = template_crud.get_active_for_operation(db, operation_type)
+        snap = self._load(db, template, generation) if template else None
+        with self._lock:
+            if generation == self._generation:
+                self._active[operation_type] = snap.id if snap else None
+        return snap
+
+    def get_item_template(self, db: Session, item_template_id: int) -> Optional[ItemTemplateSnapshot]:
+        self._ensure_fresh(db)
+        generation = self._generation
+        it = self._items.get(item_template_id)
+        if it is not None:
+            return it
+        item = template_item_crud.get(db, item_template_id)
+        if not item:
+            return None
+        # грузим шаблон целиком: соседние пункты понадобятся следующими запросами
+        template = template_crud.get(db, item.template_id)
+        if template:
+            snap = self._load(db, template, generation)
+            for it in snap.items:
+                if it.id == item_template_id:
+                    return it
+        return ItemTemplateSnapshot.from_model(item)
+
+
+template_cache = TemplateCache()
+
+
+def ensure_templates_version(db: Session) -> None:
+    """Создаёт строку версии заранее (init_db), чтобы bump был одним UPDATE без гонки на первой записи."""
+    if db.get(CacheVersion, CACHE_NAME) is not None:
+        return
+    db.add(CacheVersion(name=CACHE_NAME, version=0))
+    try:
+        db.commit()
+    except IntegrityError:
+        # соседний воркер стартовал одновременно и успел создать строку
+        db.rollback()
+
+
+def bump_templates_version(db: Session) -> None:
+    """
+    Вызывать в транзакции, которая пишет шаблоны (commit — на вызывающем).
+    Свой кэш сбрасываем сразу, остальные воркеры — при следующей сверке версии.
+    """
+    db.execute(
+        update(CacheVersion).where(CacheVersion.name == CACHE_NAME).values(version=CacheVersion.version + 1)
+    )
+    template_cache.clear()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.models.refresh_token import RefreshToken
+from src.models.user import User
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_aware(dt: datetime) -> datetime:
+    # SQLite возвращает naive datetime
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _hash_token(raw: str) -> str:
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _invalid() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+
+
+def issue_refresh_token(db: Session, user_id: int, family_id: str | None = None) -> str:
+    """
+    Добавляет refresh token в сессию (commit — на вызывающем) и возвращает сырой токен.
+    """
+    raw = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_token(raw),
+        family_id=family_id or uuid.uuid4().hex,
+        expires_at=_utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return raw
+
+
+def _revoke_family(db: Session, family_id: str) -> None:
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=_utcnow())
+    )
+
+
+def rotate_refresh_token(db: Session, raw: str) -> tuple[User, str]:
+    """
+    Обменивает refresh token на новый (старый отзывается). Без bcrypt:
+    один поиск по индексу token_hash, один UPDATE и одна вставка.
+    """
+    token = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(raw)).one_or_none()
+    if not token:
+        raise _invalid()
+
+    if token.revoked_at is not None:
+        # токен уже использовали — похоже на утечку: гасим всю цепочку
+        _revoke_family(db, token.family_id)
+        db.commit()
+        raise _invalid()
+
+    if _as_aware(token.expires_at) <= _utcnow():
+        raise _invalid()
+
+    # условный UPDATE: из двух параллельных обменов одного токена выигрывает один
+    revoked = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == token.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=_utcnow())
+    ).rowcount
+    if revoked != 1:
+        db.rollback()
+        raise _invalid()
+
+    user = db.get(User, token.user_id)
+    if not user or not user.is_active:
+        _revoke_family(db, token.family_id)
+        db.commit()
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User inactive")
+
+    new_raw = issue_refresh_token(db, user.id, family_id=token.family_id)
+    db.commit()
+    return user, new_raw
+
+
+def revoke_refresh_token(db: Session, raw: str) -> None:
+    """Logout: отзывает цепочку, к которой относится токен (неизвестный токен — не ошибка)."""
+    token = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(raw)).one_or_none()
+    if token:
+        _revoke_family(db, token.family_id)
+        db.commit()
+
+
+def purge_expired_refresh_tokens(db: Session) -> int:
+    deleted = db.query(RefreshToken).filter(RefreshToken.expires_at < _utcnow()).delete(synchronize_session=False)
+    db.commit()
+    return deleted
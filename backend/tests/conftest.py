@@ -0,0 +1,52 @@
+"""
+Тесты гоняются на временной SQLite: python -m pytest tests (из backend/).
+Настройки читаются при импорте src.*, поэтому окружение готовим здесь, до импорта приложения.
+"""
+import os
+import tempfile
+import uuid
+
+_DB_DIR = tempfile.mkdtemp(prefix="eyes-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_DIR}/test.db")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("DB_SSLMODE", "disable")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from src.main import app
+
+    with TestClient(app) as c:  # startup -> init_db
+        yield c
+
+
+@pytest.fixture
+def org_user(client):
+    """Организация + пользователь с ролью; возвращает (user_id, org_id, заголовки с токеном)."""
+    from src.core.jwt import create_access_token
+    from src.db.session import SessionLocal
+    from src.models import Organization, User, UserRole
+
+    def make(role: str = "feldsher", organization_id: int | None = None):
+        with SessionLocal() as db:
+            if organization_id is None:
+                org = Organization(name=f"Org {uuid.uuid4().hex[:8]}")
+                db.add(org)
+                db.flush()
+                organization_id = org.id
+            user = User(
+                full_name=f"Test {role}",
+                email=f"{role}.{uuid.uuid4().hex[:8]}@test.local",
+                hashed_password="!",
+                role=UserRole(role),
+                organization_id=organization_id,
+            )
+            db.add(user)
+            db.commit()
+            token = create_access_token({"sub": user.email, "role": role})
+            return user.id, organization_id, {"Authorization": f"Bearer {token}"}
+
+    return make
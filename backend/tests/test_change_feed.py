@@ -0,0 +1,81 @@
+"""
+/sync/changes: курсор не должен проскакивать изменения, закоммиченные позже.
+Тест с двумя писателями требует PostgreSQL: TEST_POSTGRES_URL=postgresql+psycopg2://...
+(на SQLite писатели сериализованы и такой гонки нет).
+"""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from src.models import SyncChange
+from src.services.change_feed import get_changes
+
+ADMIN = SimpleNamespace(role=SimpleNamespace(value="admin"), organization_id=None)
+PG_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+def _deleted_ids(out) -> set[int]:
+    return {ref.id for ref in out.deleted}
+
+
+def _record(db, entity_id: int) -> None:
+    # deleted=True: лента отдаёт только DeletedRef и не грузит сущности
+    db.add(SyncChange(entity="patient", entity_id=entity_id, deleted=True))
+    db.flush()
+
+
+@pytest.fixture
+def pg_sessions():
+    if not PG_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    from sqlalchemy import create_engine, delete
+    from sqlalchemy.orm import sessionmaker
+
+    engine = create_engine(PG_URL)
+    SyncChange.__table__.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(delete(SyncChange))
+    make = sessionmaker(bind=engine)
+    yield make
+    engine.dispose()
+
+
+def test_late_commit_of_lower_id_is_not_skipped(pg_sessions):
+    writer_a, writer_b, reader = pg_sessions(), pg_sessions(), pg_sessions()
+    try:
+        _record(writer_a, 1)      # берёт id N, но коммитит последним
+        _record(writer_b, 2)      # берёт id N+1 и коммитит сразу
+        writer_b.commit()
+
+        first = get_changes(reader, ADMIN, since=0)
+        assert _deleted_ids(first) == {2}
+
+        writer_a.commit()
+        second = get_changes(reader, ADMIN, since=first.cursor)
+        assert _deleted_ids(second) == {1}
+        assert second.cursor > first.cursor
+
+        assert get_changes(reader, ADMIN, since=second.cursor).deleted == []
+    finally:
+        for s in (writer_a, writer_b, reader):
+            s.close()
+
+
+def test_feed_cursor_advances(client):
+    from src.db.session import SessionLocal
+
+    with SessionLocal() as db:
+        since = get_changes(db, ADMIN, since=0, limit=1000).cursor
+        while True:
+            page = get_changes(db, ADMIN, since=since, limit=1000)
+            since = page.cursor
+            if not page.has_more:
+                break
+        _record(db, 10_001)
+        _record(db, 10_002)
+        db.commit()
+
+        out = get_changes(db, ADMIN, since=since)
+        assert _deleted_ids(out) == {10_001, 10_002}
+        assert get_changes(db, ADMIN, since=out.cursor).deleted == []
@@ -0,0 +1,56 @@
+"""
+Распознавание повтора op_id. PostgreSQL-часть требует TEST_POSTGRES_URL=postgresql+psycopg2://...
+"""
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from src.db.session import SessionLocal
+from src.models import OperationLogId
+from src.services.sync_service import _is_op_id_conflict
+
+PG_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+def _integrity_error(make_session, *objs) -> IntegrityError:
+    with make_session() as db:
+        with pytest.raises(IntegrityError) as exc:
+            for obj in objs:
+                db.add(obj)
+                db.flush()
+        return exc.value
+
+
+def _duplicate_op_id(make_session) -> IntegrityError:
+    op_id = uuid.uuid4().hex
+    with make_session() as db:
+        db.add(OperationLogId(op_id=op_id))
+        db.commit()
+    return _integrity_error(make_session, OperationLogId(op_id=op_id))
+
+
+def _other_violation(make_session) -> IntegrityError:
+    # в тексте ошибки есть op_id, но это NOT NULL, а не повтор
+    return _integrity_error(make_session, OperationLogId(op_id=None))
+
+
+def test_op_id_conflict_sqlite(client):
+    assert _is_op_id_conflict(_duplicate_op_id(SessionLocal))
+    assert not _is_op_id_conflict(_other_violation(SessionLocal))
+
+
+def test_op_id_conflict_postgres():
+    if not PG_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    engine = create_engine(PG_URL)
+    OperationLogId.__table__.create(bind=engine, checkfirst=True)
+    make = sessionmaker(bind=engine)
+    try:
+        assert _is_op_id_conflict(_duplicate_op_id(make))
+        assert not _is_op_id_conflict(_other_violation(make))
+    finally:
+        engine.dispose()
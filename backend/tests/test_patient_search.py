@@ -0,0 +1,46 @@
+from src.db.session import SessionLocal
+from src.models import Patient
+from src.services.patient_search import normalize_patient_identifiers
+
+
+def _patient(org_id, **values) -> int:
+    with SessionLocal() as db:
+        p = Patient(organization_id=org_id, **values)
+        db.add(p)
+        db.commit()
+        return p.id
+
+
+def _search(client, headers, q) -> list[int]:
+    r = client.get("/patients/search", params={"q": q}, headers=headers)
+    assert r.status_code == 200, r.text
+    return [p["id"] for p in r.json()]
+
+
+def test_yo_is_folded_to_ye(client, org_user):
+    _, org_id, headers = org_user("feldsher")
+    patient_id = _patient(org_id, fio="Семёнов Пётр Алексеевич")
+
+    assert patient_id in _search(client, headers, "петр")
+    assert patient_id in _search(client, headers, "Семенов Пётр")
+
+
+def test_name_with_digit_is_not_identifier_search(client, org_user):
+    _, org_id, headers = org_user("feldsher")
+    patient_id = _patient(org_id, fio="Пётр Иванов")
+
+    assert patient_id in _search(client, headers, "пётр 3")
+
+
+def test_legacy_identifiers_are_normalized(client, org_user):
+    _, org_id, headers = org_user("feldsher")
+    # записан до нормализации полиса/СНИЛС при записи
+    patient_id = _patient(org_id, fio="Legacy", snils="112-233-445 95", polis="77 00-1234 5678 9012")
+
+    with SessionLocal() as db:
+        assert normalize_patient_identifiers(db) >= 1
+        p = db.get(Patient, patient_id)
+        assert (p.snils, p.polis) == ("11223344595", "7700123456789012")
+
+    assert _search(client, headers, "7700 1234 5678 9012") == [patient_id]
+    assert _search(client, headers, "112-233-445 95") == [patient_id]
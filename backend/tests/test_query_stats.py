@@ -0,0 +1,24 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.db.query_stats import query_report, query_stats_middleware
+
+
+def test_unmatched_paths_share_one_label():
+    app = FastAPI()
+    app.middleware("http")(query_stats_middleware)
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        return {"id": item_id}
+
+    query_report.reset()
+    with TestClient(app) as c:
+        for path in ("/items/1", "/items/2", "/nope/1", "/nope/2", "/wp-login.php"):
+            c.get(path)
+        c.request("PROPFIND", "/whatever")
+
+    snapshot = query_report.snapshot()
+    assert set(snapshot) == {"GET /items/{item_id}", "<unmatched>"}
+    assert snapshot["<unmatched>"]["requests"] == 4
+    query_report.reset()
@@ -0,0 +1,55 @@
+import uuid
+from datetime import timedelta
+
+from src.db.session import SessionLocal
+from src.models import SyncJob
+from src.services import sync_jobs
+
+
+def _job(db, user_id, **values) -> str:
+    job = SyncJob(id=uuid.uuid4().hex, user_id=user_id, total_ops=1, **values)
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def test_orphaned_job_is_failed_live_job_is_kept(org_user):
+    user_id, _, _ = org_user("feldsher")
+    now = sync_jobs._utcnow()
+    with SessionLocal() as db:
+        dead = _job(db, user_id, status="running", worker_id="dead:1:x", heartbeat_at=now - timedelta(hours=1))
+        legacy = _job(db, user_id, status="queued")  # до появления heartbeat
+        # старая job, но владелец жив — по возрасту не трогаем
+        alive = _job(db, user_id, status="running", worker_id="alive:2:y", heartbeat_at=now)
+        db.query(SyncJob).filter(SyncJob.id == alive).update({"started_at": now - timedelta(hours=2)})
+        db.commit()
+
+        sync_jobs.fail_orphaned_jobs(db)
+
+        statuses = dict(db.query(SyncJob.id, SyncJob.status).filter(SyncJob.id.in_([dead, legacy, alive])).all())
+    assert statuses == {dead: "failed", legacy: "failed", alive: "running"}
+
+
+def test_final_write_does_not_revive_failed_job(org_user):
+    user_id, _, _ = org_user("feldsher")
+    with SessionLocal() as db:
+        job_id = _job(db, user_id, status="failed", worker_id=sync_jobs.WORKER_ID)
+
+        assert not sync_jobs._set_status(db, job_id, "running", status="done", result={"results": []})
+
+        job = db.get(SyncJob, job_id)
+        assert job.status == "failed"
+        assert job.result is None
+
+
+def test_execute_job_skips_job_already_failed(org_user):
+    user_id, _, _ = org_user("feldsher")
+    with SessionLocal() as db:
+        job_id = _job(db, user_id, status="failed", worker_id=sync_jobs.WORKER_ID)
+
+    sync_jobs._execute_job(job_id, [], user_id)
+
+    with SessionLocal() as db:
+        job = db.get(SyncJob, job_id)
+        assert job.status == "failed"
+        assert job.started_at is None
@@ -0,0 +1,88 @@
+import json
+import uuid
+
+import pytest
+
+zstandard = pytest.importorskip("zstandard")
+
+from src.core.config import settings  # noqa: E402
+
+
+def _ndjson(ops: list[dict]) -> bytes:
+    return b"".join(json.dumps(op).encode() + b"\n" for op in ops)
+
+
+def _create_ops(n: int) -> list[dict]:
+    return [
+        {"op_id": uuid.uuid4().hex, "action": "create_patient", "payload": {"fio": f"Поток {i}"}}
+        for i in range(n)
+    ]
+
+
+def _post_stream(client, headers, body: bytes, encoding: str):
+    return client.post(
+        "/sync/batch/stream",
+        content=body,
+        headers={**headers, "Content-Type": "application/x-ndjson", "Content-Encoding": encoding},
+    )
+
+
+def test_zstd_ndjson_stream_applies_all_ops(client, org_user):
+    _, _, headers = org_user("feldsher")
+    ops = _create_ops(25)
+
+    resp = _post_stream(client, headers, zstandard.ZstdCompressor().compress(_ndjson(ops)), "zstd")
+
+    assert resp.status_code == 200
+    results = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["op_id"] for r in results] == [op["op_id"] for op in ops]
+    assert {r["status"] for r in results} == {"applied"}
+
+
+def test_gzip_ndjson_stream_applies_all_ops(client, org_user):
+    import gzip
+
+    _, _, headers = org_user("feldsher")
+    ops = _create_ops(5)
+
+    resp = _post_stream(client, headers, gzip.compress(_ndjson(ops)), "gzip")
+
+    assert resp.status_code == 200
+    assert [json.loads(line)["status"] for line in resp.text.splitlines()] == ["applied"] * 5
+
+
+def test_oversize_zstd_stream_is_cut_with_error_line(client, org_user, monkeypatch):
+    _, _, headers = org_user("feldsher")
+    monkeypatch.setattr(settings, "SYNC_STREAM_MAX_BODY_BYTES", 64 * 1024)
+    # ~1 МиБ распакованного из нескольких КиБ сжатого
+    body = _ndjson(_create_ops(3)) + b" " * (1024 * 1024)
+
+    resp = _post_stream(client, headers, zstandard.ZstdCompressor().compress(body), "zstd")
+
+    assert resp.status_code == 200
+    last = json.loads(resp.text.splitlines()[-1])
+    assert last == {"op_id": "", "status": "error", "message": "Request body too large"}
+
+
+def test_broken_zstd_stream_reports_error_line(client, org_user):
+    _, _, headers = org_user("feldsher")
+
+    resp = _post_stream(client, headers, b"\x28\xb5\x2f\xfd" + b"garbage" * 100, "zstd")
+
+    assert resp.status_code == 200
+    assert json.loads(resp.text.splitlines()[-1]) == {
+        "op_id": "", "status": "error", "message": "Malformed compressed body",
+    }
+
+
+def test_sync_batch_rejects_oversize_body_by_content_length(client, org_user, monkeypatch):
+    _, _, headers = org_user("feldsher")
+    monkeypatch.setattr(settings, "SYNC_MAX_BODY_BYTES", 1024)
+
+    resp = client.post(
+        "/sync/batch",
+        content=json.dumps({"ops": _create_ops(50)}).encode(),
+        headers={**headers, "Content-Type": "application/json"},
+    )
+
+    assert resp.status_code == 413
@@ -0,0 +1,48 @@
+import pytest
+
+from src.api import checklists as checklists_api
+from src.db.session import SessionLocal
+from src.models import CacheVersion, ChecklistTemplate
+from src.services.template_cache import CACHE_NAME
+
+
+def _version() -> int:
+    with SessionLocal() as db:
+        return db.get(CacheVersion, CACHE_NAME).version
+
+
+def _create_template(client, headers) -> int:
+    r = client.post(
+        "/checklists/templates",
+        json={"title": "Катаракта", "operation_type": "cataract", "items": [{"title": "ОАК"}]},
+        headers=headers,
+    )
+    assert r.status_code == 200, r.text
+    return r.json()["id"]
+
+
+def test_template_writes_bump_version(client, org_user):
+    _, _, headers = org_user("admin")
+    before = _version()  # строку создал init_db
+
+    template_id = _create_template(client, headers)
+    r = client.patch(f"/checklists/templates/{template_id}", json={"title": "Катаракта v2"}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["items"][0]["title"] == "ОАК"
+
+    assert _version() == before + 2
+
+
+def test_template_update_and_bump_are_one_transaction(client, org_user, monkeypatch):
+    _, _, headers = org_user("admin")
+    template_id = _create_template(client, headers)
+
+    def broken_bump(db):
+        raise RuntimeError("bump failed")
+
+    monkeypatch.setattr(checklists_api, "bump_templates_version", broken_bump)
+    with pytest.raises(RuntimeError):
+        client.patch(f"/checklists/templates/{template_id}", json={"title": "Не сохранится"}, headers=headers)
+
+    with SessionLocal() as db:
+        assert db.get(ChecklistTemplate, template_id).title == "Катаракта"